@@ -7,18 +7,29 @@
 
 示例:
     python 11.py test.jpg --num_candidates 10 --visualize
+    python 11.py testimg --save_result --batch_size 8
+    python 11.py video.mp4 --save_result --frame_stride 5
+    python 11.py 0   # 摄像头 0，Ctrl+C 结束
 """
 
 import argparse
 import os
 import time
-from pathlib import Path
 import json
 
+import numpy as np
+
 # 导入自定义模块
 from yolo_detector import YOLODetector
 from llm_generator import LLMGenerator
 from clip_ranker import CLIPRanker
+from caption_dedup import CandidateDeduper
+from caption_index import CaptionIndex
+from image_dedup import fan_out_results, group_duplicates
+from image_frame import ImageFrame, as_frame
+from image_payload import payload_stats
+from video_stream import SceneChangeDetector, iter_frames
+import llm_client
 import utils
 import config
 
@@ -26,8 +37,28 @@ import config
 class ImageCaptionGenerator:
     """图像描述生成系统"""
     
-    def __init__(self):
-        """初始化所有模块"""
+    def __init__(
+        self,
+        output_dir=config.OUTPUT_DIR,
+        retrieval=config.RETRIEVAL_ENABLED,
+        llm_concurrency=config.LLM_CONCURRENCY,
+        llm_stream=config.LLM_STREAM,
+        llm_cache=config.LLM_CACHE_ENABLED,
+        llm_cache_epoch=config.LLM_CACHE_EPOCH,
+        llm_cache_refresh=False
+    ):
+        """
+        初始化所有模块
+        
+        Args:
+            output_dir: 输出目录（检索索引与 output.json 存放在一起）
+            retrieval: 是否启用检索快速通道（复用相似历史图像的描述）
+            llm_concurrency: 批量生成时同时在途的 LLM 请求数
+            llm_stream: 是否流式生成（单张图像时候选到达即送入 CLIP 增量排序）
+            llm_cache: 是否启用 LLM 响应缓存
+            llm_cache_epoch: 响应缓存轮次（修改后重新采样）
+            llm_cache_refresh: 不读取响应缓存，只写入新响应
+        """
         print("="*60)
         print("图像描述生成系统 - 基于 Socratic Models")
         print("="*60)
@@ -37,23 +68,35 @@ class ImageCaptionGenerator:
         self.yolo_detector = YOLODetector()
         print()
         
-        self.llm_generator = LLMGenerator()
+        self.llm_generator = LLMGenerator(
+            stream=llm_stream,
+            use_cache=llm_cache,
+            cache_epoch=llm_cache_epoch,
+            cache_refresh=llm_cache_refresh
+        )
+        self.llm_concurrency = llm_concurrency
         print()
         
         self.clip_ranker = CLIPRanker()
         print()
         
+        # 近重复候选去重（CLIP 只为每簇代表打分）
+        self.deduper = CandidateDeduper() if config.DEDUP_ENABLED else None
+        
+        # 检索快速通道：历史描述的图像特征索引
+        self.caption_index = CaptionIndex(self.clip_ranker.model_tag, output_dir) if retrieval else None
+        
         print("="*60)
         print("所有模块初始化完成！")
         print("="*60)
         print()
     
-    def generate(self, image_path, num_candidates=config.NUM_CANDIDATES):
+    def generate(self, image, num_candidates=config.NUM_CANDIDATES):
         """
-        生成图像描述的完整流程
+        生成图像描述的完整流程（图像只读盘、解码一次，各阶段共享）
         
         Args:
-            image_path: 图像路径
+            image: 图像路径或 ImageFrame
             num_candidates: 候选描述数量
             
         Returns:
@@ -66,23 +109,252 @@ class ImageCaptionGenerator:
                 'time_cost': dict           # 各阶段耗时
             }
         """
-        print(f"\n处理图像: {image_path}\n")
+        frame = as_frame(image)
+        print(f"\n处理图像: {frame.label}\n")
+        
+        # ========== 检索快速通道 ==========
+        features = None
+        if self.caption_index is not None:
+            retrieved, features = self._retrieve([frame])
+            if retrieved[0] is not None:
+                return retrieved[0]
         
         time_cost = {}
         
         # ========== 步骤1: YOLO 检测 ==========
         print("▶ 步骤 1/3: YOLO 物体检测")
         t1 = time.time()
-        yolo_result = self.yolo_detector.detect(image_path)
+        yolo_result = self.yolo_detector.detect(frame)
         time_cost['yolo'] = time.time() - t1
         print(f"   耗时: {time_cost['yolo']:.2f} 秒\n")
         
+        result = self._generate_from_detection(
+            frame, yolo_result, time_cost, num_candidates
+        )
+        self._index_results([frame], [result], features)
+        return result
+    
+    def generate_batch(
+        self,
+        images,
+        num_candidates=config.NUM_CANDIDATES,
+        batch_size=config.YOLO_BATCH_SIZE
+    ):
+        """
+        批量生成图像描述：YOLO 按批推理，LLM 并发生成，每张图像的候选返回后立即 CLIP 排序
+        
+        Args:
+            images: 图像路径或 ImageFrame 列表
+            num_candidates: 候选描述数量
+            batch_size: YOLO 每批处理的图像数量
+            
+        Returns:
+            list: 与 images 一一对应的结果字典，格式同 generate()；
+                  LLM 生成失败或没有候选的图像对应位置为异常对象，其余图像的结果不受影响
+        """
+        frames = [as_frame(image) for image in images]
+        if not frames:
+            return []
+        
+        # ========== 检索快速通道：命中的图像不进入后续流程 ==========
+        if self.caption_index is not None:
+            outputs, features = self._retrieve(frames)
+            pending = [i for i, output in enumerate(outputs) if output is None]
+            if pending:
+                results = self._generate_batch([frames[i] for i in pending], num_candidates, batch_size)
+                self._index_results([frames[i] for i in pending], results, features[pending])
+                for i, result in zip(pending, results):
+                    outputs[i] = result
+            return outputs
+        
+        return self._generate_batch(frames, num_candidates, batch_size)
+    
+    def _generate_batch(self, frames, num_candidates, batch_size):
+        """对一批图像运行完整的 YOLO→LLM→CLIP 流程"""
+        # ========== 步骤1: YOLO 批量检测 ==========
+        print(f"▶ 步骤 1/3: YOLO 批量检测 ({len(frames)} 张图像)")
+        t1 = time.time()
+        yolo_results = self.yolo_detector.detect_batch(frames, batch_size=batch_size)
+        yolo_time = time.time() - t1
+        print(f"   耗时: {yolo_time:.2f} 秒\n")
+        
+        # ========== 步骤2+3: LLM 并发生成，每张图像的候选返回后立即 CLIP 排序 ==========
+        print(f"▶ 步骤 2-3/3: LLM 并发生成 + CLIP 逐张排序 ({len(frames)} 张图像, 并发上限 {self.llm_concurrency})")
+        t2 = time.time()
+        jobs = [(yolo_result, frame, num_candidates) for frame, yolo_result in zip(frames, yolo_results)]
+        outputs = [None] * len(frames)
+        clip_time = 0.0
+        for i, candidates, elapsed in self.llm_generator.iter_candidates(jobs, self.llm_concurrency):
+            if isinstance(candidates, Exception):
+                # 生成失败的图像对应位置直接返回异常
+                print(f"   ✗ {frames[i].label}: 生成失败 ({type(candidates).__name__}: {candidates})")
+                outputs[i] = candidates
+                continue
+            if not candidates:
+                print(f"   ✗ {frames[i].label}: 没有生成任何候选")
+                outputs[i] = ValueError("LLM 没有生成任何候选描述")
+                continue
+            print(f"   {frames[i].label}: {len(candidates)} 个候选 (请求耗时 {elapsed:.2f} 秒)")
+            if len(candidates) < num_candidates:
+                print(f"   ⚠ 警告: 只生成了 {len(candidates)}/{num_candidates} 个候选")
+            
+            # 去重与排序在等待其余请求返回时完成
+            t3 = time.time()
+            try:
+                representatives, cluster_of = self._collapse(candidates)
+                ranked_captions = self._expand(
+                    self.clip_ranker.rank_captions(frames[i], representatives), candidates, cluster_of
+                )
+            except Exception as e:
+                print(f"   ✗ {frames[i].label}: 排序失败 ({type(e).__name__}: {e})")
+                outputs[i] = e
+                continue
+            finally:
+                rank_time = time.time() - t3
+                clip_time += rank_time
+            time_cost = {'yolo': yolo_time / len(frames), 'llm': elapsed, 'clip': rank_time}
+            outputs[i] = self._build_output(yolo_results[i], time_cost, candidates, ranked_captions)
+        total_time = time.time() - t2
+        print(f"   耗时: {total_time:.2f} 秒 (其中 CLIP {clip_time:.2f} 秒)\n")
+        return outputs
+    
+    def _generate_from_detection(self, frame, yolo_result, time_cost, num_candidates):
+        """在已有 YOLO 结果的基础上完成 LLM 生成与 CLIP 排序"""
+        if self.llm_generator.stream:
+            return self._stream_and_rank(frame, yolo_result, time_cost, num_candidates)
+        
+        candidates = self._generate_candidates(frame, yolo_result, time_cost, num_candidates)
+        if not candidates:
+            raise ValueError("LLM 没有生成任何候选描述")
+        
+        # ========== 步骤3: CLIP 排序 ==========
+        print("▶ 步骤 3/3: CLIP 相似度计算与排序")
+        t3 = time.time()
+        representatives, cluster_of = self._collapse(candidates)
+        ranked_captions = self._expand(
+            self.clip_ranker.rank_captions(frame, representatives), candidates, cluster_of
+        )
+        time_cost['clip'] = time.time() - t3
+        print(f"   耗时: {time_cost['clip']:.2f} 秒\n")
+        
+        return self._build_output(yolo_result, time_cost, candidates, ranked_captions)
+    
+    def _stream_and_rank(self, frame, yolo_result, time_cost, num_candidates):
+        """
+        流式生成：每个有效候选到达后立即送入 CLIP 增量排序，凑满 num_candidates 个后停止生成
+        
+        启用候选去重时只为每簇代表打分，近重复候选沿用代表的分数（与 _collapse/_expand 一致）
+        """
+        # ========== 步骤2+3: LLM 流式生成，CLIP 边到达边打分 ==========
+        print("▶ 步骤 2-3/3: LLM 流式生成 + CLIP 增量排序")
+        t2 = time.time()
+        ranker = self.clip_ranker.start_ranking(frame, k=num_candidates)
+        clip_time = time.time() - t2
+        
+        candidates = []
+        leaders = []   # 各簇代表的 MinHash 签名
+        members = []   # 与 leaders 一一对应：簇内全部候选（第一个为代表）
+        for candidate in self.llm_generator.stream_candidates(yolo_result, frame, num_candidates):
+            candidates.append(candidate)
+            t3 = time.time()
+            cluster = self.deduper.match(candidate, leaders) if self.deduper is not None else None
+            if cluster is None:
+                members.append([candidate])
+                ranker.add([candidate])
+            else:
+                members[cluster].append(candidate)
+            clip_time += time.time() - t3
+        
+        time_cost['llm'] = time.time() - t2 - clip_time
+        time_cost['clip'] = clip_time
+        print(f"   耗时: LLM {time_cost['llm']:.2f} 秒, CLIP {time_cost['clip']:.2f} 秒\n")
+        if not candidates:
+            raise ValueError("LLM 没有生成任何候选描述")
+        if len(candidates) < num_candidates:
+            print(f"   ⚠ 警告: 只生成了 {len(candidates)}/{num_candidates} 个候选\n")
+        if len(members) < len(candidates):
+            print(f"   去重: {len(candidates)} 个候选合并为 {len(members)} 个\n")
+        
+        # 展开为全部候选的排序（同簇成员紧跟在代表之后）
+        by_representative = {group[0]: group for group in members}
+        ranked_captions = [
+            (candidate, score)
+            for representative, score in ranker.topk()
+            for candidate in by_representative[representative]
+        ]
+        return self._build_output(yolo_result, time_cost, candidates, ranked_captions)
+    
+    def _retrieve(self, frames):
+        """
+        在历史描述索引中查找相似图像
+        
+        Returns:
+            (outputs, features): 命中的图像为复用描述的结果字典，未命中为 None；
+                                 features 为各图像的 CLIP 特征（未命中的图像生成后加入索引）
+        """
+        t0 = time.time()
+        features = self.clip_ranker.image_features(frames)
+        
+        outputs = [None] * len(frames)
+        hits = []
+        for i, feature in enumerate(features):
+            similarity, entry = self.caption_index.search(feature)
+            if entry is not None:
+                hits.append((i, similarity, entry))
+        
+        if hits:
+            # 复用的描述对当前图像重新打分（文本特征通常已在缓存中）
+            text_features = self.clip_ranker.text_features([entry['caption'] for _, _, entry in hits])
+            lookup_time = (time.time() - t0) / len(frames)
+            for (i, similarity, entry), text_feature in zip(hits, text_features):
+                score = np.float32(features[i] @ text_feature)
+                print(f"[检索] {frames[i].label}: 与 {entry['image_name']} 相似度 {similarity:.4f}，复用其描述")
+                self.caption_index.record_saving(entry, lookup_time)
+                outputs[i] = {
+                    'best_caption': entry['caption'],
+                    'best_score': score,
+                    'yolo_result': None,
+                    'candidates': [entry['caption']],
+                    'ranked_captions': [(entry['caption'], score)],
+                    'time_cost': {'retrieval': lookup_time, 'total': lookup_time},
+                    'retrieved_from': entry['image_name'],
+                }
+        return outputs, features
+    
+    def _index_results(self, frames, results, features):
+        """将新生成的描述加入检索索引（只收录磁盘上的图像）"""
+        if self.caption_index is None:
+            return
+        for frame, result, feature in zip(frames, results, features):
+            if frame.path and not isinstance(result, Exception):
+                self.caption_index.add(
+                    feature, frame.name, result['best_caption'],
+                    result['best_score'], result['time_cost']['total']
+                )
+    
+    def _collapse(self, candidates):
+        """合并近重复候选，返回 (各簇代表, 簇下标)；未启用去重时原样返回"""
+        if self.deduper is None:
+            return candidates, None
+        representatives, cluster_of = self.deduper.collapse(candidates)
+        if len(representatives) < len(candidates):
+            print(f"   去重: {len(candidates)} 个候选合并为 {len(representatives)} 个")
+        return representatives, cluster_of
+    
+    def _expand(self, ranked, candidates, cluster_of):
+        """将代表的排序展开为全部候选的排序（同簇成员沿用代表分数）"""
+        if cluster_of is None:
+            return ranked
+        return CandidateDeduper.expand(ranked, candidates, cluster_of)
+    
+    def _generate_candidates(self, frame, yolo_result, time_cost, num_candidates):
+        """LLM 生成候选描述（耗时记入 time_cost['llm']）"""
         # ========== 步骤2: LLM 生成候选 ==========
         print("▶ 步骤 2/3: LLM 生成候选描述")
         t2 = time.time()
         candidates = self.llm_generator.generate_candidates(
             yolo_result, 
-            image_path,
+            frame,
             num_candidates=num_candidates
         )
         time_cost['llm'] = time.time() - t2
@@ -92,13 +364,10 @@ class ImageCaptionGenerator:
         if len(candidates) < num_candidates:
             print(f"   ⚠ 警告: 只生成了 {len(candidates)}/{num_candidates} 个候选\n")
         
-        # ========== 步骤3: CLIP 排序 ==========
-        print("▶ 步骤 3/3: CLIP 相似度计算与排序")
-        t3 = time.time()
-        ranked_captions = self.clip_ranker.rank_captions(image_path, candidates)
-        time_cost['clip'] = time.time() - t3
-        print(f"   耗时: {time_cost['clip']:.2f} 秒\n")
-        
+        return candidates
+    
+    def _build_output(self, yolo_result, time_cost, candidates, ranked_captions):
+        """汇总单张图像的最佳描述与各阶段耗时"""
         # ========== 获取最佳结果 ==========
         best_caption, best_score = ranked_captions[0]
         
@@ -141,81 +410,222 @@ def process_single_image(
     """
     try:
         # ---------- 生成描述 ----------
-        result = generator.generate(image_path, num_candidates)
+        frame = ImageFrame(image_path)
+        result = generator.generate(frame, num_candidates)
+        handle_result(frame, result, generator, output_dir, save_result, visualize)
+    except KeyboardInterrupt:
+        print("\n[INFO] Interrupted by user (Ctrl+C)")
+        raise
+    except Exception as e:
+        print(f"\n错误: 生成失败")
+        print(f"详细信息: {e}")
+        import traceback
+        traceback.print_exc()
 
-        if save_result:
-            os.makedirs(output_dir, exist_ok=True)
-            image_name = Path(image_path).stem
 
-            # ---------- 保存 output.json ----------
-            output_json_path = os.path.join(output_dir, "output.json")
-            if os.path.exists(output_json_path):
+def process_image_batch(
+    image_paths,
+    generator,
+    output_dir,
+    num_candidates,
+    batch_size=config.YOLO_BATCH_SIZE,
+    save_result=False,
+    visualize=False
+):
+    """
+    批量处理多张图像：每次取 max(batch_size, LLM 并发数) 张图像，YOLO 按 batch_size 分批推理，
+    LLM 请求最多 llm_concurrency 个同时在途，其余步骤与 process_single_image 相同；
+    只有生成失败的图像逐张重试，同批其余图像的结果照常保存
+    """
+    # 每组图像数不小于 LLM 并发数，否则在途请求数受 batch_size 限制
+    window = max(batch_size, generator.llm_concurrency)
+    for start in range(0, len(image_paths), window):
+        chunk = image_paths[start:start + window]
+        frames = [ImageFrame(image_path) for image_path in chunk]
+        try:
+            results = generator.generate_batch(frames, num_candidates, batch_size=batch_size)
+        except KeyboardInterrupt:
+            print("\n[INFO] Interrupted by user (Ctrl+C)")
+            raise
+        except Exception as e:
+            print(f"\n错误: 批量生成失败，逐张重试")
+            print(f"详细信息: {e}")
+            for image_path in chunk:
+                process_single_image(
+                    image_path, generator, output_dir, num_candidates,
+                    save_result=save_result, visualize=visualize
+                )
+            continue
+        
+        for image_path, frame, result in zip(chunk, frames, results):
+            if isinstance(result, Exception):
+                print(f"\n错误: 生成失败，单独重试: {frame.label}")
+                print(f"详细信息: {result}")
+                process_single_image(
+                    image_path, generator, output_dir, num_candidates,
+                    save_result=save_result, visualize=visualize
+                )
+                continue
+            try:
+                handle_result(frame, result, generator, output_dir, save_result, visualize)
+            except KeyboardInterrupt:
+                print("\n[INFO] Interrupted by user (Ctrl+C)")
+                raise
+            except Exception as e:
+                print(f"\n错误: 保存结果失败: {frame.label}")
+                print(f"详细信息: {e}")
+                import traceback
+                traceback.print_exc()
+
+
+def process_video(
+    source,
+    generator,
+    output_dir,
+    num_candidates,
+    frame_stride=config.VIDEO_FRAME_STRIDE,
+    save_result=False
+):
+    """
+    处理视频文件或摄像头帧流：
+    - 逐帧惰性解码，用颜色直方图检测场景切换
+    - 只有关键帧运行 YOLO→LLM→CLIP，其余帧沿用最近关键帧的描述
+    - 保存 <视频名>_video.json（每帧一条记录）
+    """
+    scene_detector = SceneChangeDetector()
+    records = []
+    caption, score, keyframe_index = None, None, None
+    num_keyframes = 0
+    start = time.time()
+    
+    try:
+        for index, timestamp, frame in iter_frames(source, frame_stride):
+            is_keyframe = scene_detector.is_keyframe(frame.bgr)
+            if is_keyframe:
+                num_keyframes += 1
+                print(f"\n[视频] 第 {index} 帧 ({timestamp:.2f}s): 场景切换，重新生成描述")
                 try:
-                    with open(output_json_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                    if not isinstance(data, list):
-                        data = []
-                except json.JSONDecodeError:
+                    result = generator.generate(frame, num_candidates)
+                    caption = result['best_caption']
+                    score = float(result['best_score'])
+                    keyframe_index = index
+                except Exception as e:
+                    # 本帧沿用上一关键帧的描述；重置参考直方图，下一个采样帧重新作为关键帧生成
+                    print(f"\n错误: 第 {index} 帧生成失败，下一帧重试")
+                    print(f"详细信息: {e}")
+                    scene_detector.reset()
+            
+            records.append({
+                "frame_index": index,
+                "timestamp": timestamp,
+                "is_keyframe": is_keyframe,
+                "keyframe_index": keyframe_index,
+                "generated_text": caption,
+                "clip_score": score,
+            })
+    except KeyboardInterrupt:
+        # 摄像头流通过 Ctrl+C 结束
+        print("\n[INFO] Interrupted by user (Ctrl+C)")
+    
+    elapsed = time.time() - start
+    print(f"\n[视频] 共处理 {len(records)} 帧，关键帧 {num_keyframes} 个 "
+          f"({num_keyframes / max(len(records), 1):.1%})，总耗时 {elapsed:.2f} 秒")
+    
+    if save_result:
+        os.makedirs(output_dir, exist_ok=True)
+        name = f"camera{source}" if str(source).isdigit() else os.path.splitext(os.path.basename(source))[0]
+        output_json_path = os.path.join(output_dir, f"{name}_video.json")
+        with open(output_json_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+        print(f"[保存] 结果已保存到: {output_json_path}")
+    
+    return records
+
+
+def handle_result(frame, result, generator, output_dir, save_result=False, visualize=False):
+    """保存（output.json / 文本 / YOLO 可视化）并按需可视化单张图像的结果"""
+    if save_result:
+        os.makedirs(output_dir, exist_ok=True)
+        image_name = frame.name
+
+        # ---------- 保存 output.json ----------
+        output_json_path = os.path.join(output_dir, "output.json")
+        if os.path.exists(output_json_path):
+            try:
+                with open(output_json_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if not isinstance(data, list):
                     data = []
-            else:
+            except json.JSONDecodeError:
                 data = []
-            
-            new_item = {
-                "image_name": image_name,
-                "generated_text": result['best_caption'],
-                "clip_score": float(result['best_score']),
-                "time_cost": result['time_cost'],
-            }
-            found = False
-            for i, item in enumerate(data):
-                if item.get("image_name") == image_name:
-                    data[i] = new_item
-                    found = True
-                    break
-            if not found:
-                data.append(new_item)
+        else:
+            data = []
+        
+        new_item = {
+            "image_name": image_name,
+            "generated_text": result['best_caption'],
+            "clip_score": float(result['best_score']),
+            "time_cost": result['time_cost'],
+        }
+        if 'retrieved_from' in result:
+            # 检索快速通道复用的描述，记录来源图像
+            new_item["retrieved_from"] = result['retrieved_from']
+        elif 'yolo_path' in result['yolo_result']:
+            # 自适应分辨率所走路径，便于按路径统计 YOLO 耗时
+            new_item["yolo_path"] = result['yolo_result']['yolo_path']
+        found = False
+        for i, item in enumerate(data):
+            if item.get("image_name") == image_name:
+                data[i] = new_item
+                found = True
+                break
+        if not found:
+            data.append(new_item)
 
-            with open(output_json_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+        with open(output_json_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
 
-            # ---------- 保存文本结果 ----------
-            text_output = os.path.join(output_dir, f"{image_name}_result.txt")
-            utils.save_results_to_file(
-                image_path,
-                result['yolo_result'],
-                result['candidates'],
-                result['ranked_captions'],
-                text_output
-            )
+        # 复用描述的结果没有 YOLO 检测与候选，只写 output.json
+        if result['yolo_result'] is None:
+            return
 
-            # ---------- 保存YOLO可视化 ----------
-            yolo_output = os.path.join(output_dir, f"{image_name}_yolo.jpg")
-            generator.yolo_detector.visualize(
-                result['yolo_result'], save_path=yolo_output
-            )
+        # ---------- 保存文本结果 ----------
+        text_output = os.path.join(output_dir, f"{image_name}_result.txt")
+        utils.save_results_to_file(
+            frame,
+            result['yolo_result'],
+            result['candidates'],
+            result['ranked_captions'],
+            text_output
+        )
 
-        # ---------- 可视化 ----------
-        if visualize:
-            vis_output = None
-            if save_result:
-                vis_output = os.path.join(
-                    output_dir, f"{image_name}_visualization.png"
-                )
-            utils.visualize_results(
-                image_path,
-                result['yolo_result'],
-                result['candidates'],
-                result['ranked_captions'],
-                save_path=vis_output
+        # ---------- 保存YOLO可视化 ----------
+        yolo_output = os.path.join(output_dir, f"{image_name}_yolo.jpg")
+        generator.yolo_detector.visualize(
+            result['yolo_result'], save_path=yolo_output, image=frame
+        )
+
+    # ---------- 可视化 ----------
+    if visualize and result['yolo_result'] is not None:
+        vis_output = None
+        if save_result:
+            vis_output = os.path.join(
+                output_dir, f"{image_name}_visualization.png"
             )
-    except KeyboardInterrupt:
-        print("\n[INFO] Interrupted by user (Ctrl+C)")
-        raise
-    except Exception as e:
-        print(f"\n错误: 生成失败")
-        print(f"详细信息: {e}")
-        import traceback
-        traceback.print_exc()
+        utils.visualize_results(
+            frame,
+            result['yolo_result'],
+            result['candidates'],
+            result['ranked_captions'],
+            save_path=vis_output
+        )
+
+def positive_int(value):
+    """argparse 类型：正整数"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必须为正整数: {value}")
+    return number
 
 def main():
     """主函数"""
@@ -226,7 +636,7 @@ def main():
     parser.add_argument(
         "image_path", 
         type=str, 
-        help="输入图像路径"
+        help="输入图像、目录、视频文件路径，或摄像头编号"
     )
     parser.add_argument(
         "--num_candidates", 
@@ -250,16 +660,88 @@ def main():
         default=config.OUTPUT_DIR,
         help=f"输出目录 (默认: {config.OUTPUT_DIR})"
     )
+    parser.add_argument(
+        "--batch_size",
+        type=positive_int,
+        default=config.YOLO_BATCH_SIZE,
+        help=f"目录模式下 YOLO 批量推理的图像数量 (默认: {config.YOLO_BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--retrieval",
+        action="store_true",
+        default=config.RETRIEVAL_ENABLED,
+        help=f"启用检索快速通道：与历史图像的 CLIP 相似度 ≥ {config.RETRIEVAL_THRESHOLD} 时复用其描述"
+    )
+    parser.add_argument(
+        "--llm_concurrency",
+        type=positive_int,
+        default=config.LLM_CONCURRENCY,
+        help=f"目录模式下同时在途的 LLM 请求数，每组处理的图像数取 batch_size 与该值中的较大者 (默认: {config.LLM_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--stream",
+        action=argparse.BooleanOptionalAction,
+        default=config.LLM_STREAM,
+        help="流式生成：候选到达即送入 CLIP 排序，凑满候选数后停止生成 (默认: %(default)s)"
+    )
+    parser.add_argument(
+        "--llm_cache",
+        action=argparse.BooleanOptionalAction,
+        default=config.LLM_CACHE_ENABLED,
+        help="LLM 响应缓存：未改动的图像直接复用上次的候选，不再重新采样 (默认: %(default)s)"
+    )
+    parser.add_argument(
+        "--llm_cache_epoch",
+        type=int,
+        default=config.LLM_CACHE_EPOCH,
+        help=f"响应缓存轮次，换一个值即对相同输入重新采样 (默认: {config.LLM_CACHE_EPOCH})"
+    )
+    parser.add_argument(
+        "--llm_cache_refresh",
+        action="store_true",
+        help="不读取响应缓存，重新生成并覆盖旧条目"
+    )
+    parser.add_argument(
+        "--dedup",
+        action=argparse.BooleanOptionalAction,
+        default=config.IMAGE_DEDUP_ENABLED,
+        help="目录模式下按感知哈希合并重复图像，每组只处理一次 (默认: %(default)s)"
+    )
+    parser.add_argument(
+        "--frame_stride",
+        type=positive_int,
+        default=config.VIDEO_FRAME_STRIDE,
+        help=f"视频模式下每隔多少帧取一帧 (默认: {config.VIDEO_FRAME_STRIDE})"
+    )
     
     args = parser.parse_args()
     
-    # 检查图像是否存在
-    if not os.path.exists(args.image_path):
+    # 检查图像是否存在（纯数字视为摄像头编号）
+    is_camera = args.image_path.isdigit() and not os.path.exists(args.image_path)
+    if not is_camera and not os.path.exists(args.image_path):
         print(f"错误: 图像或目录不存在: {args.image_path}")
         return
     
-    generator = ImageCaptionGenerator()
-    if os.path.isfile(args.image_path):
+    generator = ImageCaptionGenerator(
+        output_dir=args.output_dir,
+        retrieval=args.retrieval,
+        llm_concurrency=args.llm_concurrency,
+        llm_stream=args.stream,
+        llm_cache=args.llm_cache,
+        llm_cache_epoch=args.llm_cache_epoch,
+        llm_cache_refresh=args.llm_cache_refresh
+    )
+    if is_camera or (os.path.isfile(args.image_path) and utils.is_video_file(args.image_path)):
+        process_video(
+            source=args.image_path,
+            generator=generator,
+            output_dir=args.output_dir,
+            num_candidates=args.num_candidates,
+            frame_stride=args.frame_stride,
+            save_result=args.save_result
+        )
+
+    elif os.path.isfile(args.image_path):
         if not utils.is_image_file(args.image_path):
             raise ValueError(f"Not an image file: {args.image_path}")
         process_single_image(
@@ -272,18 +754,97 @@ def main():
         )
 
     elif os.path.isdir(args.image_path):
+        image_paths = []
         for filename in sorted(os.listdir(args.image_path)):
             file_path = os.path.join(args.image_path, filename)
             if os.path.isfile(file_path) and utils.is_image_file(file_path):
-                process_single_image(
-                    image_path=file_path,
-                    generator=generator,
-                    output_dir=args.output_dir,
-                    num_candidates=args.num_candidates,
-                    save_result=args.save_result,
-                    visualize=args.visualize
-                )
+                image_paths.append(file_path)
+        # 重复图像每组只处理代表，结果再写给组内其他图像
+        groups = group_duplicates(image_paths) if args.dedup else None
+        process_image_batch(
+            image_paths=list(groups) if groups else image_paths,
+            generator=generator,
+            output_dir=args.output_dir,
+            num_candidates=args.num_candidates,
+            batch_size=args.batch_size,
+            save_result=args.save_result,
+            visualize=args.visualize
+        )
+        if groups and args.save_result:
+            fan_out_results(
+                os.path.join(args.output_dir, "output.json"), groups,
+                lambda path: os.path.splitext(os.path.basename(path))[0]
+            )
+    
+    # ---------- 自适应分辨率统计 ----------
+    detector = generator.yolo_detector
+    if detector.adaptive:
+        stats = detector.adaptive_summary()
+        # 没有图像重新推理时无法估计全尺寸耗时
+        saved = "未知（无全尺寸推理可参考）" if stats['saved_ms'] is None else f"{stats['saved_ms']:.0f} ms"
+        print(f"\n[YOLO] 自适应分辨率: 仅低分辨率 {stats['low']} 张, 全尺寸重新推理 {stats['full']} 张 "
+              f"({stats['rerun_rate']:.1%}), 估计节省 {saved}")
+    
+    # ---------- 检测缓存统计 ----------
+    cache = generator.yolo_detector.cache
+    if cache is not None:
+        cache.flush()
+        stats = cache.stats()
+        print(f"\n[YOLO] 检测缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+              f"命中率 {stats['hit_rate']:.1%}, 淘汰 {stats['evictions']} 条")
+    
+    # ---------- LLM 限流统计 ----------
+    controller = generator.llm_generator.controller
+    if controller is not None and controller.requests:
+        stats = controller.stats()
+        print(f"\n[LLM] 并发上限: 当前 {stats['limit']} (峰值 {stats['peak_limit']}), 请求 {stats['requests']} 次, "
+              f"限流 {stats['throttled']} 次, 重试 {stats['retries']} 次, 失败 {stats['failures']} 次, "
+              f"延迟 p95 {stats['p95_latency']:.2f} 秒")
+    response_cache = generator.llm_generator.response_cache
+    if response_cache is not None:
+        stats = response_cache.stats()
+        print(f"[LLM] 响应缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+              f"命中率 {stats['hit_rate']:.1%}, 估计节省 {stats['saved_seconds']:.1f} 秒, "
+              f"共 {stats['entries']} 条 ({stats['size_mb']:.1f} MB), 淘汰 {stats['evictions']} 条")
+    stats = generator.llm_generator.stream_stats
+    if stats['streams']:
+        print(f"[LLM] 流式生成: {stats['streams']} 次, 凑满候选后提前停止 {stats['early_stops']} 次, "
+              f"首个候选平均 {stats['first_candidate_seconds'] / stats['streams']:.2f} 秒")
+    stats = payload_stats.stats()
+    if stats['images']:
+        print(f"[LLM] 图像负载: {stats['images']} 张, 原始 {stats['original_mb']:.2f} MB -> "
+              f"上传 {stats['uploaded_mb']:.2f} MB (减少 {stats['reduction']:.1%}), "
+              f"估计节省上传 {stats['saved_seconds']:.2f} 秒")
+    stats = llm_client.connection_stats.stats()
+    if stats['requests']:
+        print(f"[LLM] HTTP 连接: 请求 {stats['requests']} 次, 新建连接 {stats['new_connections']} 次 "
+              f"(握手均值 {stats['handshake_ms']:.0f} ms), 复用 {stats['reused']} 次, "
+              f"估计节省 {stats['saved_seconds']:.2f} 秒")
+    
+    # ---------- 检索快速通道统计 ----------
+    if generator.caption_index is not None:
+        generator.caption_index.save()
+        stats = generator.caption_index.stats()
+        print(f"\n[检索] 查询 {stats['queries']} 次, 命中 {stats['hits']} 次 ({stats['hit_rate']:.1%}), "
+              f"估计节省 {stats['saved_seconds']:.1f} 秒, 索引共 {stats['entries']} 条")
+    
+    # ---------- 候选去重统计 ----------
+    if generator.deduper is not None:
+        stats = generator.deduper.stats()
+        print(f"\n[去重] 候选 {stats['candidates']} 个, 实际编码 {stats['representatives']} 个, "
+              f"节省文本编码 {stats['saved']} 次 ({stats['saved_rate']:.1%})")
     
+    # ---------- CLIP 嵌入缓存统计 ----------
+    clip_ranker = generator.clip_ranker
+    clip_ranker.flush_cache()
+    if clip_ranker.text_cache is not None:
+        stats = clip_ranker.text_cache.stats()
+        print(f"[CLIP] 文本嵌入缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+              f"命中率 {stats['hit_rate']:.1%}, 淘汰 {stats['evictions']} 条")
+    if clip_ranker.image_store is not None:
+        stats = clip_ranker.image_store.stats()
+        print(f"[CLIP] 图像嵌入存储: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+              f"命中率 {stats['hit_rate']:.1%}, 共 {stats['entries']} 张")
 
 
 if __name__ == "__main__":
@@ -1,25 +1,28 @@
 import argparse
-import base64
 import config
 from clip_ranker import CLIPRanker
+from image_dedup import fan_out_results, group_duplicates
 import json
 import os
 import time
 import utils
-from openai import OpenAI
+import llm_client
+from image_frame import ImageFrame
+from image_payload import payload_stats, prepare_payload
 
 def encode_image(image_path):
-  with open(image_path, "rb") as image_file:
-    return base64.b64encode(image_file.read()).decode('utf-8')
+    """缩放并重新编码后的图像 base64 字符串"""
+    return encode_image_payload(image_path)[1]
+
+def encode_image_payload(image_path):
+    """缩放并重新编码后的上传负载: (MIME 类型, base64)"""
+    return prepare_payload(ImageFrame(image_path))
 
 def generate_image_description(image_path):
-    client = OpenAI(
-        api_key=config.OPENAI_API_KEY,
-        base_url=config.OPENAI_API_BASE
-    )
+    # 进程共享的客户端：连接池中的长连接跨图像复用，省去每张图像的 TCP/TLS 握手
+    client = llm_client.get_client()
 
-    img_type = "image/{}".format(image_path.split('.')[-1])
-    img_b64_str = encode_image(image_path)
+    img_type, img_b64_str = encode_image_payload(image_path)
 
     messages = [
         {
@@ -53,13 +56,47 @@ def generate_image_description(image_path):
     return time_cost, generated_text
 
 def generate_and_save_results(image_path, output_json_path, cr, save_result):
-    time_cost, generated_text = generate_image_description(image_path)
-    clip_score = None
-    if cr is not None:
-        _, clip_score = cr.rank_captions(
-            image_path,
-            [generated_text]
-        )[0]
+    generate_and_save_batch([image_path], output_json_path, cr, save_result)
+
+def generate_and_save_batch(image_paths, output_json_path, cr, save_result):
+    """
+    逐张调用 LLM 生成描述，再对这批图像做一次 CLIP 批量评分并保存
+    单张图像生成失败时跳过该图像；没有 CLIP 分数的描述不写入结果文件
+    """
+    generated = []
+    for image_path in image_paths:
+        try:
+            generated.append((image_path, *generate_image_description(image_path)))
+        except Exception as e:
+            print(f"Failed to generate description for {image_path}: {e}")
+    if not generated:
+        return
+    clip_scores = score_descriptions(cr, generated)
+    for (image_path, time_cost, generated_text), clip_score in zip(generated, clip_scores):
+        if clip_score is None:
+            print(f"Skipping {image_path}: no CLIP score for \"{generated_text}\"")
+            continue
+        save_single_result(image_path, time_cost, generated_text, clip_score, output_json_path, save_result)
+
+def score_descriptions(cr, generated):
+    """CLIP 批量评分；整批失败时逐张重试，仍失败的图像分数为 None"""
+    try:
+        ranked = cr.rank_batch([
+            (image_path, [generated_text]) for image_path, _, generated_text in generated
+        ])
+        return [r[0][1] for r in ranked]
+    except Exception as e:
+        print(f"Batch CLIP scoring failed, retrying one image at a time: {e}")
+    clip_scores = []
+    for image_path, _, generated_text in generated:
+        try:
+            clip_scores.append(cr.rank_batch([(image_path, [generated_text])])[0][0][1])
+        except Exception as e:
+            print(f"CLIP scoring failed for {image_path}: {e}")
+            clip_scores.append(None)
+    return clip_scores
+
+def save_single_result(image_path, time_cost, generated_text, clip_score, output_json_path, save_result):
     print(f"Response costs: {time_cost:.2f}s")
     print(f"Generated text: {generated_text}")
     print(f"CLIP score: {clip_score:.4f}")
@@ -117,6 +154,12 @@ if __name__ == "__main__":
         default=True,
         help="Whether to save output_baseline.json (default: True)"
     )
+    parser.add_argument(
+        "--dedup",
+        action=argparse.BooleanOptionalAction,
+        default=config.IMAGE_DEDUP_ENABLED,
+        help="Merge duplicate images by perceptual hash and describe each group once (default: %(default)s)"
+    )
     args = parser.parse_args()
 
     input_path = args.path
@@ -136,10 +179,44 @@ if __name__ == "__main__":
         generate_and_save_results(input_path, output_json_path, cr, args.save_result)
 
     elif os.path.isdir(input_path):
+        image_paths = []
         for filename in sorted(os.listdir(input_path)):
             file_path = os.path.join(input_path, filename)
             if os.path.isfile(file_path) and utils.is_image_file(file_path):
-                generate_and_save_results(file_path, output_json_path, cr, args.save_result)
+                image_paths.append(file_path)
+        # 重复图像每组只调用一次 LLM，结果再写给组内其他图像
+        groups = group_duplicates(image_paths) if args.dedup else None
+        if groups:
+            image_paths = list(groups)
+        # CLIP 按小批评分（每批结果评分后立即保存，中断时丢失的 LLM 结果不超过一批）
+        batch_size = config.BASELINE_SCORE_BATCH_SIZE
+        for start in range(0, len(image_paths), batch_size):
+            generate_and_save_batch(
+                image_paths[start:start + batch_size], output_json_path, cr, args.save_result
+            )
+        if groups and args.save_result:
+            fan_out_results(output_json_path, groups, lambda path: path.split('/')[-1])
 
     else:
-        raise ValueError(f"Invalid path: {input_path}")
\ No newline at end of file
+        raise ValueError(f"Invalid path: {input_path}")
+
+    stats = payload_stats.stats()
+    if stats['images']:
+        print(f"[LLM] 图像负载: {stats['images']} 张, 原始 {stats['original_mb']:.2f} MB -> "
+              f"上传 {stats['uploaded_mb']:.2f} MB (减少 {stats['reduction']:.1%}), "
+              f"估计节省上传 {stats['saved_seconds']:.2f} 秒")
+    stats = llm_client.connection_stats.stats()
+    if stats['requests']:
+        print(f"[LLM] HTTP 连接: 请求 {stats['requests']} 次, 新建连接 {stats['new_connections']} 次 "
+              f"(握手均值 {stats['handshake_ms']:.0f} ms), 复用 {stats['reused']} 次, "
+              f"估计节省 {stats['saved_seconds']:.2f} 秒")
+
+    cr.flush_cache()
+    if cr.text_cache is not None:
+        stats = cr.text_cache.stats()
+        print(f"[CLIP] 文本嵌入缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+              f"命中率 {stats['hit_rate']:.1%}")
+    if cr.image_store is not None:
+        stats = cr.image_store.stats()
+        print(f"[CLIP] 图像嵌入存储: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+              f"命中率 {stats['hit_rate']:.1%}")
\ No newline at end of file
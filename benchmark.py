@@ -0,0 +1,563 @@
+"""
+性能基准测试脚本
+
+使用方法:
+    python benchmark.py backend [图像目录] [--repeat 3]
+    python benchmark.py tiling [图像目录] [--tile_size 640] [--overlap 0.2] [--workers 0]
+    python benchmark.py adaptive [图像目录] [--low_imgsz 320]
+    python benchmark.py quantize [图像目录] [--result_dir outputs] [--report 报告路径]
+    python benchmark.py padding [图像目录] [--result_dir outputs]
+    python benchmark.py llm [--requests 60] [--concurrency 16] [--capacity 6] [--throttle_rate 0.05]
+    python benchmark.py http [--requests 10] [--stub]
+    python benchmark.py payload [图像目录] [--max_side 1280] [--quality 85]
+
+示例:
+    python benchmark.py backend testimg
+    python benchmark.py tiling testimg --tile_size 320
+    python benchmark.py adaptive testimg
+    python benchmark.py quantize testimg --report outputs/quantization_report.json
+    python benchmark.py padding testimg
+    python benchmark.py llm --capacity 4 --delay 0.5
+    python benchmark.py http --requests 20
+    python benchmark.py payload testimg --max_side 1024
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import config
+import utils
+
+
+def list_images(image_dir):
+    """按文件名顺序列出目录下的图像"""
+    return [
+        os.path.join(image_dir, f) for f in sorted(os.listdir(image_dir))
+        if utils.is_image_file(f)
+    ]
+
+
+def time_calls(fn, items, repeat=1, warmup=1):
+    """
+    对每个输入重复计时，返回各次调用的耗时（毫秒）
+    
+    模块内部的打印会被屏蔽，避免干扰计时
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in items[:warmup]:
+            fn(item)
+        latencies = []
+        for _ in range(repeat):
+            for item in items:
+                t = time.perf_counter()
+                fn(item)
+                latencies.append((time.perf_counter() - t) * 1000)
+    return np.asarray(latencies)
+
+
+def format_latency(name, latencies):
+    """格式化延迟统计"""
+    return (f"{name:<16} mean {latencies.mean():8.1f} ms   "
+            f"p50 {np.percentile(latencies, 50):8.1f} ms   "
+            f"p95 {np.percentile(latencies, 95):8.1f} ms")
+
+
+def bench_backend(args):
+    """YOLO 推理后端对比：torch vs onnx（逐张 detect，不使用检测缓存）"""
+    from yolo_detector import YOLODetector
+    
+    images = list_images(args.image_dir)
+    print(f"图像数量: {len(images)}，重复 {args.repeat} 次\n")
+    
+    outputs = {}
+    for backend in ("torch", "onnx"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            detector = YOLODetector(use_cache=False, backend=backend)
+        latencies = time_calls(detector.detect, images, repeat=args.repeat)
+        with contextlib.redirect_stdout(io.StringIO()):
+            outputs[backend] = [detector.detect(p) for p in images]
+        print(format_latency(backend, latencies))
+    
+    # 检测结果一致性
+    same_counts = sum(
+        a['counts'] == b['counts'] and a['positions'] == b['positions']
+        for a, b in zip(outputs['torch'], outputs['onnx'])
+    )
+    print(f"\n物体/数量/位置完全一致: {same_counts}/{len(images)}")
+
+
+def bench_tiling(args):
+    """整图推理 vs 切片推理：延迟与检测数量（含小物体）对比"""
+    from box_ops import box_area
+    from yolo_detector import YOLODetector
+    
+    images = list_images(args.image_dir)
+    print(f"图像数量: {len(images)}，重复 {args.repeat} 次")
+    print(f"切片参数: tile={args.tile_size}, overlap={args.overlap}, workers={args.workers}\n")
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector = YOLODetector(use_cache=False)
+    
+    modes = {
+        "full-frame": detector.detect,
+        "tiled": lambda p: detector.detect_tiled(
+            p, tile_size=args.tile_size, overlap=args.overlap, workers=args.workers
+        ),
+    }
+    for name, fn in modes.items():
+        latencies = time_calls(fn, images, repeat=args.repeat)
+        with contextlib.redirect_stdout(io.StringIO()):
+            detections = [fn(p)['detections'] for p in images]
+        total = sum(len(d) for d in detections)
+        small = sum(int((box_area(d.xyxy) < 32 * 32).sum()) for d in detections)
+        print(f"{format_latency(name, latencies)}   检测框 {total:5d} (小物体 {small})")
+
+
+def bench_adaptive(args):
+    """固定分辨率 vs 自适应分辨率：延迟、重新推理比例与检测结果一致性"""
+    from yolo_detector import YOLODetector
+    
+    images = list_images(args.image_dir)
+    config.YOLO_ADAPTIVE_LOW_IMGSZ = args.low_imgsz
+    print(f"图像数量: {len(images)}，重复 {args.repeat} 次")
+    print(f"低分辨率: {args.low_imgsz}，全尺寸: {config.YOLO_IMGSZ}\n")
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector = YOLODetector(use_cache=False)
+    
+    modes = {
+        "fixed": detector.detect,
+        "adaptive": detector.detect_adaptive,
+    }
+    outputs = {}
+    for name, fn in modes.items():
+        latencies = time_calls(fn, images, repeat=args.repeat)
+        with contextlib.redirect_stdout(io.StringIO()):
+            outputs[name] = [fn(p) for p in images]
+        print(format_latency(name, latencies))
+    
+    paths = [r['yolo_path'] for r in outputs['adaptive']]
+    same_counts = sum(
+        a['counts'] == b['counts']
+        for a, b in zip(outputs['fixed'], outputs['adaptive'])
+    )
+    print(f"\n全尺寸重新推理: {paths.count('full')}/{len(images)}")
+    print(f"物体/数量完全一致: {same_counts}/{len(images)}")
+
+
+def load_saved_candidates(result_path):
+    """从 11.py 保存的 <图像名>_result.txt 中读取 LLM 候选描述"""
+    if not os.path.exists(result_path):
+        return []
+    with open(result_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    section = text.split("LLM 生成的候选描述", 1)[-1].split("CLIP 相似度排序", 1)[0]
+    return re.findall(r"^\d+\. (.+)$", section, flags=re.MULTILINE)
+
+
+def match_rate(reference, detections, iou_threshold=0.5):
+    """reference 中能在 detections 里找到同类别且 IoU >= iou_threshold 的框的比例"""
+    from box_ops import box_iou
+    
+    if len(reference) == 0:
+        return 1.0
+    if len(detections) == 0:
+        return 0.0
+    iou = box_iou(reference.xyxy, detections.xyxy)
+    iou *= reference.cls[:, None] == detections.cls[None, :]
+    return float((iou.max(axis=1) >= iou_threshold).mean())
+
+
+def rank_correlation(scores_a, scores_b):
+    """两组分数排序的 Spearman 秩相关系数"""
+    if len(scores_a) < 2:
+        return 1.0
+    ranks_a = np.argsort(np.argsort(scores_a))
+    ranks_b = np.argsort(np.argsort(scores_b))
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+
+def bench_quantize(args):
+    """fp32 vs int8 动态量化：YOLO 检测与 CLIP 排序的保真度和延迟"""
+    from clip_ranker import CLIPRanker
+    from image_frame import ImageFrame
+    from yolo_detector import YOLODetector
+    
+    images = list_images(args.image_dir)
+    frames = [ImageFrame(p) for p in images]
+    print(f"图像数量: {len(images)}，重复 {args.repeat} 次\n")
+    report = {"num_images": len(images), "yolo": {}, "clip": {}}
+    
+    # ---------- YOLO：同为 onnx 后端，只比较量化带来的差异 ----------
+    outputs = {}
+    for name, quantize in (("fp32", False), ("int8", True)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            detector = YOLODetector(use_cache=False, backend="onnx", quantize=quantize)
+        latencies = time_calls(detector.detect, frames, repeat=args.repeat)
+        with contextlib.redirect_stdout(io.StringIO()):
+            outputs[name] = [detector.detect(frame) for frame in frames]
+        report["yolo"][f"{name}_mean_ms"] = float(latencies.mean())
+        print(format_latency(f"YOLO {name}", latencies))
+    
+    same_counts = sum(
+        a['counts'] == b['counts'] for a, b in zip(outputs['fp32'], outputs['int8'])
+    )
+    box_match = np.mean([
+        match_rate(a['detections'], b['detections'])
+        for a, b in zip(outputs['fp32'], outputs['int8'])
+    ])
+    report["yolo"]["same_counts"] = same_counts
+    report["yolo"]["box_match_rate"] = float(box_match)
+    print(f"物体数量完全一致: {same_counts}/{len(images)}，fp32 检测框匹配率 {box_match:.1%}\n")
+    
+    # ---------- CLIP：对已保存的候选描述重新排序 ----------
+    candidates = {
+        frame.path: load_saved_candidates(os.path.join(args.result_dir, f"{frame.name}_result.txt"))
+        for frame in frames
+    }
+    clip_frames = [frame for frame in frames if candidates[frame.path]]
+    if not clip_frames:
+        print(f"未在 {args.result_dir} 找到候选描述，跳过 CLIP 对比（先运行 python 11.py {args.image_dir} --save_result）")
+    else:
+        rankings = {}
+        for name, quantize in (("fp32", False), ("int8", True)):
+            # 关闭文本嵌入缓存与图像嵌入存储，两种精度都真正运行编码器
+            with contextlib.redirect_stdout(io.StringIO()):
+                ranker = CLIPRanker(quantize=quantize, use_text_cache=False, use_image_store=False)
+            latencies = time_calls(
+                lambda frame: ranker.rank_captions(frame, candidates[frame.path]),
+                clip_frames, repeat=args.repeat
+            )
+            with contextlib.redirect_stdout(io.StringIO()):
+                rankings[name] = [
+                    dict(ranker.rank_captions(frame, candidates[frame.path])) for frame in clip_frames
+                ]
+            report["clip"][f"{name}_mean_ms"] = float(latencies.mean())
+            print(format_latency(f"CLIP {name}", latencies))
+        
+        same_top1, correlations, changed = 0, [], []
+        for frame, fp32, int8 in zip(clip_frames, rankings['fp32'], rankings['int8']):
+            texts = candidates[frame.path]
+            top1_fp32, top1_int8 = max(fp32, key=fp32.get), max(int8, key=int8.get)
+            same_top1 += top1_fp32 == top1_int8
+            if top1_fp32 != top1_int8:
+                changed.append({"image_name": frame.name, "fp32": top1_fp32, "int8": top1_int8})
+            correlations.append(rank_correlation(
+                [float(fp32[t]) for t in texts], [float(int8[t]) for t in texts]
+            ))
+        report["clip"].update({
+            "num_images": len(clip_frames),
+            "same_top1": int(same_top1),
+            "mean_spearman": float(np.mean(correlations)),
+            "changed_top1": changed,
+        })
+        print(f"Top-1 描述一致: {same_top1}/{len(clip_frames)}，"
+              f"排序 Spearman 均值 {np.mean(correlations):.4f}")
+    
+    if args.report:
+        os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"\n[保存] 报告已保存到: {args.report}")
+
+
+def bench_padding(args):
+    """CLIP 文本编码：固定填充到 context_length vs 动态填充 + 长度分桶（延迟与排序一致性）"""
+    from clip_ranker import CLIPRanker
+    from image_frame import ImageFrame
+    
+    frames = [ImageFrame(p) for p in list_images(args.image_dir)]
+    candidates = {
+        frame.path: load_saved_candidates(os.path.join(args.result_dir, f"{frame.name}_result.txt"))
+        for frame in frames
+    }
+    frames = [frame for frame in frames if candidates[frame.path]]
+    if not frames:
+        print(f"未在 {args.result_dir} 找到候选描述（先运行 python 11.py {args.image_dir} --save_result）")
+        return
+    print(f"图像数量: {len(frames)}，重复 {args.repeat} 次\n")
+    
+    # 关闭缓存与图像嵌入存储，保证每次都真正运行编码器
+    with contextlib.redirect_stdout(io.StringIO()):
+        ranker = CLIPRanker(use_text_cache=False, use_image_store=False)
+    rankings = {}
+    for name, dynamic_padding in (("full-padding", False), ("dynamic", True)):
+        ranker.dynamic_padding = dynamic_padding
+        latencies = time_calls(
+            lambda frame: ranker.rank_captions(frame, candidates[frame.path]),
+            frames, repeat=args.repeat
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            rankings[name] = [
+                [c for c, _ in ranker.rank_captions(frame, candidates[frame.path])] for frame in frames
+            ]
+        print(format_latency(name, latencies))
+    
+    same_order = sum(a == b for a, b in zip(rankings['full-padding'], rankings['dynamic']))
+    print(f"\n排序完全一致: {same_order}/{len(frames)}")
+
+
+def start_stub_server(capacity, delay, throttle_rate):
+    """
+    在后台线程启动本地 OpenAI 兼容桩服务（POST .../chat/completions），无需网络即可测试限流逻辑
+    
+    同时处理的请求超过 capacity 时返回 429，延迟随负载线性增长 (delay * (1 + 负载 / capacity))，
+    另以 throttle_rate 的概率随机返回 429
+    
+    Returns:
+        (server, stats): 服务对象（结束时调用 shutdown()）与计数字典
+    """
+    stats = {'served': 0, 'throttled': 0, 'in_flight': 0, 'peak': 0}
+    lock = threading.Lock()
+    content = "\n".join(
+        f"{i}. 几个人围坐在客厅的木桌旁边交谈，桌上摆着茶杯和水果，这是第{i}条候选描述"
+        for i in range(1, config.NUM_CANDIDATES + 1)
+    )
+    
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                stats['in_flight'] += 1
+                load = stats['in_flight']
+                stats['peak'] = max(stats['peak'], load)
+            try:
+                if load > capacity or random.random() < throttle_rate:
+                    with lock:
+                        stats['throttled'] += 1
+                    self._reply(429, {"error": {"message": "rate limited", "type": "rate_limit_error"}})
+                    return
+                time.sleep(delay * (1 + load / capacity))
+                self._reply(200, {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": config.OPENAI_MODEL,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+            finally:
+                with lock:
+                    stats['in_flight'] -= 1
+                    stats['served'] += 1
+        
+        def _reply(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def bench_llm(args):
+    """LLM 自适应并发：对本地桩服务（注入 429 与负载相关延迟）并发请求，报告吞吐与控制器指标"""
+    from image_frame import ImageFrame
+    from llm_generator import LLMGenerator
+    from rate_control import AdaptiveConcurrency
+    
+    server, server_stats = start_stub_server(args.capacity, args.delay, args.throttle_rate)
+    config.LLM_USE_API = True
+    config.LLM_API_TYPE = "openai"
+    config.OPENAI_API_BASE = f"http://127.0.0.1:{server.server_port}/v1"
+    config.OPENAI_API_KEY = "stub"
+    print(f"桩服务: {config.OPENAI_API_BASE} (容量 {args.capacity}, 基础延迟 {args.delay}s, "
+          f"随机 429 {args.throttle_rate:.0%})")
+    print(f"请求数: {args.requests}，并发上限: {args.concurrency}\n")
+    
+    yolo_result = {
+        'objects': ['人', '椅子', '桌子'],
+        'counts': {'人': 2, '椅子': 4, '桌子': 1},
+        'positions': {'人': ['画面中央'], '椅子': ['画面左侧'], '桌子': ['画面中央']},
+        'scene': '室内'
+    }
+    image = ImageFrame(bgr=np.zeros((64, 64, 3), dtype=np.uint8), label="stub")
+    jobs = [(yolo_result, image, config.NUM_CANDIDATES)] * args.requests
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        # 所有请求的提示词与图像相同，关闭响应缓存才能测到真实请求
+        generator = LLMGenerator(use_cache=False)
+    generator.controller = AdaptiveConcurrency(
+        max_limit=args.concurrency, target_p95=args.target_p95, backoff_base=args.delay
+    )
+    
+    latencies = []
+    errors = []
+    t0 = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _, candidates, elapsed in generator.iter_candidates(jobs, args.concurrency):
+                if isinstance(candidates, Exception):
+                    errors.append(candidates)
+                    continue
+                latencies.append(elapsed * 1000)
+    except Exception as e:
+        print(f"请求失败: {e}")
+    if errors:
+        print(f"请求失败（重试耗尽）: {len(errors)} 个，首个: {errors[0]}")
+    wall = time.perf_counter() - t0
+    server.shutdown()
+    
+    stats = generator.controller.stats()
+    if latencies:
+        print(format_latency("request", np.asarray(latencies)))
+    print(f"完成 {len(latencies)}/{args.requests} 个，总耗时 {wall:.2f} 秒，吞吐 {len(latencies) / wall:.2f} 请求/秒")
+    print(f"并发上限: 最终 {stats['limit']}，峰值 {stats['peak_limit']}，减小 {stats['decreases']} 次")
+    print(f"控制器: 发出请求 {stats['requests']} 次，限流 {stats['throttled']} 次，"
+          f"重试 {stats['retries']} 次，失败 {stats['failures']} 次")
+    print(f"桩服务: 处理 {server_stats['served']} 次，返回 429 {server_stats['throttled']} 次，"
+          f"最大同时处理 {server_stats['peak']}")
+
+
+def bench_http(args):
+    """LLM HTTP 连接：每个请求新建客户端 vs 进程共享连接池（极短的纯文本请求，max_tokens=1）"""
+    from openai import OpenAI
+    import llm_client
+    
+    server = None
+    if args.stub:
+        server, _ = start_stub_server(capacity=args.requests, delay=0.0, throttle_rate=0.0)
+        config.OPENAI_API_BASE = f"http://127.0.0.1:{server.server_port}/v1"
+        config.OPENAI_API_KEY = "stub"
+    print(f"API Base: {config.OPENAI_API_BASE}，请求数: {args.requests}\n")
+    
+    request = {
+        "model": config.OPENAI_MODEL,
+        "messages": [{"role": "user", "content": "你好"}],
+        "max_tokens": 1,
+    }
+    
+    def new_client(_):
+        with OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_API_BASE, max_retries=0) as client:
+            client.chat.completions.create(**request)
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        shared = llm_client.get_client().with_options(max_retries=0)
+    
+    def shared_pool(_):
+        shared.chat.completions.create(**request)
+    
+    items = list(range(args.requests))
+    latencies = {}
+    for name, fn in (("new-client", new_client), ("shared-pool", shared_pool)):
+        latencies[name] = time_calls(fn, items)
+        print(format_latency(name, latencies[name]))
+    if server is not None:
+        server.shutdown()
+    
+    stats = llm_client.connection_stats.stats()
+    saved = latencies['new-client'].mean() - latencies['shared-pool'].mean()
+    print(f"\n共享连接池: 请求 {stats['requests']} 次，新建连接 {stats['new_connections']} 次 "
+          f"(握手均值 {stats['handshake_ms']:.1f} ms)，复用 {stats['reused']} 次")
+    print(f"复用连接每个请求平均节省: {saved:.1f} ms")
+
+
+def bench_payload(args):
+    """LLM 图像上传负载：原始字节 vs 缩放 + JPEG / WebP 重新编码（体积、编码耗时与估计上传耗时）"""
+    from image_frame import ImageFrame
+    from image_payload import prepare_payload
+    
+    images = list_images(args.image_dir)
+    print(f"图像数量: {len(images)}，最长边上限: {args.max_side}，质量: {args.quality}，"
+          f"上行带宽: {config.LLM_UPLOAD_MBPS} Mbit/s\n")
+    
+    upload_ms = lambda b64_bytes: b64_bytes * 8 / (config.LLM_UPLOAD_MBPS * 1e6) * 1000
+    for name, max_side, fmt in (("original", 0, "jpeg"), ("jpeg", args.max_side, "jpeg"), ("webp", args.max_side, "webp")):
+        sizes, encode_ms = [], []
+        for path in images:
+            # 每次使用新的 ImageFrame，避免命中按帧缓存的负载
+            frame = ImageFrame(path)
+            frame.bgr  # 解码不计入编码耗时（流水线中 YOLO 已解码过同一帧）
+            t = time.perf_counter()
+            _, b64 = prepare_payload(frame, max_side=max_side, fmt=fmt, quality=args.quality)
+            encode_ms.append((time.perf_counter() - t) * 1000)
+            sizes.append(len(b64))
+        sizes = np.asarray(sizes)
+        print(f"{name:<10} base64 总计 {sizes.sum() / 1024 / 1024:8.2f} MB   平均 {sizes.mean() / 1024:8.1f} KB   "
+              f"编码 {np.mean(encode_ms):6.1f} ms/张   估计上传 {upload_ms(sizes.mean()):8.1f} ms/张")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图像描述生成系统 - 性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    p = subparsers.add_parser("backend", help="YOLO 推理后端延迟对比 (torch vs onnx)")
+    p.add_argument("image_dir", nargs="?", default="testimg", help="图像目录 (默认: testimg)")
+    p.add_argument("--repeat", type=int, default=3, help="重复次数 (默认: 3)")
+    p.set_defaults(func=bench_backend)
+    
+    p = subparsers.add_parser("tiling", help="整图推理 vs 切片推理")
+    p.add_argument("image_dir", nargs="?", default="testimg", help="图像目录 (默认: testimg)")
+    p.add_argument("--repeat", type=int, default=1, help="重复次数 (默认: 1)")
+    p.add_argument("--tile_size", type=int, default=config.YOLO_TILE_SIZE, help="图块边长")
+    p.add_argument("--overlap", type=float, default=config.YOLO_TILE_OVERLAP, help="图块重叠比例")
+    p.add_argument("--workers", type=int, default=config.YOLO_TILE_WORKERS, help="并行线程数")
+    p.set_defaults(func=bench_tiling)
+    
+    p = subparsers.add_parser("adaptive", help="固定分辨率 vs 自适应分辨率")
+    p.add_argument("image_dir", nargs="?", default="testimg", help="图像目录 (默认: testimg)")
+    p.add_argument("--repeat", type=int, default=3, help="重复次数 (默认: 3)")
+    p.add_argument("--low_imgsz", type=int, default=config.YOLO_ADAPTIVE_LOW_IMGSZ, help="低分辨率预检尺寸")
+    p.set_defaults(func=bench_adaptive)
+    
+    p = subparsers.add_parser("quantize", help="fp32 vs int8 量化保真度与延迟")
+    p.add_argument("image_dir", nargs="?", default="testimg", help="图像目录 (默认: testimg)")
+    p.add_argument("--repeat", type=int, default=1, help="重复次数 (默认: 1)")
+    p.add_argument("--result_dir", default=config.OUTPUT_DIR, help="候选描述所在的结果目录")
+    p.add_argument("--report", default=os.path.join(config.OUTPUT_DIR, "quantization_report.json"),
+                   help="报告保存路径（JSON）")
+    p.set_defaults(func=bench_quantize)
+    
+    p = subparsers.add_parser("padding", help="CLIP 文本编码：固定填充 vs 动态填充")
+    p.add_argument("image_dir", nargs="?", default="testimg", help="图像目录 (默认: testimg)")
+    p.add_argument("--repeat", type=int, default=3, help="重复次数 (默认: 3)")
+    p.add_argument("--result_dir", default=config.OUTPUT_DIR, help="候选描述所在的结果目录")
+    p.set_defaults(func=bench_padding)
+    
+    p = subparsers.add_parser("llm", help="LLM 自适应并发与退避重试（本地桩服务）")
+    p.add_argument("--requests", type=int, default=60, help="请求数 (默认: 60)")
+    p.add_argument("--concurrency", type=int, default=16, help="并发上限的最大值 (默认: 16)")
+    p.add_argument("--capacity", type=int, default=6, help="桩服务可同时处理的请求数，超出返回 429 (默认: 6)")
+    p.add_argument("--delay", type=float, default=0.2, help="桩服务基础延迟，秒 (默认: 0.2)")
+    p.add_argument("--throttle_rate", type=float, default=0.05, help="随机返回 429 的概率 (默认: 0.05)")
+    p.add_argument("--target_p95", type=float, default=1.0, help="控制器的延迟 p95 目标，秒 (默认: 1.0)")
+    p.set_defaults(func=bench_llm)
+    
+    p = subparsers.add_parser("http", help="LLM HTTP：每次新建客户端 vs 共享连接池")
+    p.add_argument("--requests", type=int, default=10, help="请求数 (默认: 10)")
+    p.add_argument("--stub", action="store_true", help="使用本地桩服务而非 config.OPENAI_API_BASE")
+    p.set_defaults(func=bench_http)
+    
+    p = subparsers.add_parser("payload", help="LLM 图像上传负载：原图 vs 缩放 + 重新编码")
+    p.add_argument("image_dir", nargs="?", default="testimg", help="图像目录 (默认: testimg)")
+    p.add_argument("--max_side", type=int, default=config.LLM_IMAGE_MAX_SIDE, help="最长边上限（像素）")
+    p.add_argument("--quality", type=int, default=config.LLM_IMAGE_QUALITY, help="编码质量 (1-100)")
+    p.set_defaults(func=bench_payload)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+边界框运算模块
+功能：基于 NumPy 的 IoU、NMS 等批量边界框运算（xyxy 格式）
+"""
+
+import numpy as np
+
+
+def box_area(boxes):
+    """计算 [N, 4] 边界框面积"""
+    return (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+
+
+def box_iou(boxes1, boxes2):
+    """
+    计算两组边界框的两两 IoU
+    
+    Args:
+        boxes1: [N, 4] xyxy
+        boxes2: [M, 4] xyxy
+        
+    Returns:
+        np.ndarray: [N, M] IoU 矩阵
+    """
+    area1 = box_area(boxes1)
+    area2 = box_area(boxes2)
+    
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    wh = (rb - lt).clip(0)
+    inter = wh[..., 0] * wh[..., 1]
+    
+    union = area1[:, None] + area2[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def nms(boxes, scores, iou_threshold):
+    """
+    贪心非极大值抑制
+    
+    Args:
+        boxes: [N, 4] xyxy
+        scores: [N] 置信度
+        iou_threshold: IoU 阈值，超过该值的低分框被抑制
+        
+    Returns:
+        np.ndarray: 保留框的下标，按分数降序
+    """
+    order = np.argsort(-scores, kind='stable')
+    areas = box_area(boxes)
+    keep = []
+    
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        
+        lt = np.maximum(boxes[i, :2], boxes[rest, :2])
+        rb = np.minimum(boxes[i, 2:], boxes[rest, 2:])
+        wh = (rb - lt).clip(0)
+        inter = wh[:, 0] * wh[:, 1]
+        union = areas[i] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        
+        order = rest[iou <= iou_threshold]
+    
+    return np.asarray(keep, dtype=np.int64)
+
+
+def batched_nms(boxes, scores, classes, iou_threshold, max_wh=7680):
+    """
+    按类别分别做 NMS（通过给不同类别的框加坐标偏移实现，与 ultralytics 一致）
+    
+    Returns:
+        np.ndarray: 保留框的下标，按分数降序
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = classes.astype(boxes.dtype)[:, None] * max_wh
+    return nms(boxes + offsets, scores, iou_threshold)
@@ -0,0 +1,158 @@
+"""
+候选描述去重模块
+功能：用字符 n-gram MinHash 将只差标点或个别词语的候选描述聚类，
+      CLIP 只为每个簇的代表编码打分，再将分数展开回完整的排序列表
+"""
+
+import unicodedata
+import zlib
+
+import numpy as np
+import config
+
+_PRIME = (1 << 31) - 1  # 哈希置换的模数（保证 uint64 乘法不溢出）
+
+
+def normalize_caption(text):
+    """去掉标点与空白并统一全角/半角，只比较文字内容"""
+    text = unicodedata.normalize("NFKC", text)
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] not in "PZ")
+
+
+def char_ngrams(text, n):
+    """归一化文本的字符 n-gram 集合（短于 n 的文本整体作为一个 n-gram）"""
+    text = normalize_caption(text)
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class CandidateDeduper:
+    """基于 MinHash 的近重复候选聚类（每簇以最先出现的候选为代表）"""
+    
+    def __init__(
+        self,
+        threshold=config.DEDUP_SIMILARITY_THRESHOLD,
+        ngram=config.DEDUP_NGRAM,
+        num_perm=config.DEDUP_NUM_PERM,
+        seed=0
+    ):
+        """
+        Args:
+            threshold: MinHash 估计的 Jaccard 相似度达到该值视为近重复
+            ngram: 字符 n-gram 长度
+            num_perm: MinHash 置换数量（越大估计越准）
+            seed: 置换参数的随机种子（固定以保证结果可复现）
+        """
+        self.threshold = threshold
+        self.ngram = ngram
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+        
+        self.num_candidates = 0
+        self.num_representatives = 0
+    
+    def signatures(self, texts):
+        """[N, num_perm] MinHash 签名"""
+        signatures = np.empty((len(texts), len(self._a)), dtype=np.uint64)
+        for i, text in enumerate(texts):
+            hashes = np.fromiter(
+                (zlib.crc32(gram.encode("utf-8")) % _PRIME for gram in char_ngrams(text, self.ngram)),
+                dtype=np.uint64
+            )
+            signatures[i] = ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+        return signatures
+    
+    def collapse(self, candidates):
+        """
+        聚类候选描述
+        
+        Args:
+            candidates: 候选描述列表
+        
+        Returns:
+            (representatives, cluster_of):
+                representatives: 各簇代表（按首次出现顺序）
+                cluster_of: [N] 每个候选所属簇在 representatives 中的下标
+        """
+        n = len(candidates)
+        cluster_of = np.full(n, -1, dtype=np.int64)
+        if n:
+            signatures = self.signatures(candidates)
+            # 两两签名相同位置的比例 = Jaccard 相似度估计
+            similarity = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=-1)
+            
+            # 先到先得的 leader 聚类：簇内每个成员都与代表足够相似（不会链式传递）
+            num_clusters = 0
+            for i in range(n):
+                if cluster_of[i] >= 0:
+                    continue
+                members = (similarity[i] >= self.threshold) & (cluster_of < 0)
+                members[:i] = False
+                cluster_of[members] = num_clusters
+                cluster_of[i] = num_clusters
+                num_clusters += 1
+        
+        first = np.unique(cluster_of, return_index=True)[1]
+        representatives = [candidates[i] for i in first.tolist()]
+        
+        self.num_candidates += n
+        self.num_representatives += len(representatives)
+        return representatives, cluster_of
+    
+    def match(self, candidate, leader_signatures):
+        """
+        增量聚类（流式生成时候选逐个到达），规则与 collapse() 相同：先到先得，只与各簇代表比较
+        
+        Args:
+            candidate: 新到达的候选描述
+            leader_signatures: 已有代表的 MinHash 签名列表（调用方持有，初始为空；新代表会追加到其中）
+        
+        Returns:
+            int: 近重复代表在 leader_signatures 中的下标；candidate 成为新代表时返回 None
+        """
+        signature = self.signatures([candidate])[0]
+        self.num_candidates += 1
+        for i, leader in enumerate(leader_signatures):
+            if (signature == leader).mean() >= self.threshold:
+                return i
+        leader_signatures.append(signature)
+        self.num_representatives += 1
+        return None
+    
+    @staticmethod
+    def expand(ranked_representatives, candidates, cluster_of):
+        """
+        将代表的排序结果展开为全部候选的排序列表
+        
+        同簇成员沿用代表的分数，紧跟在代表之后（保持原始顺序）
+        
+        Args:
+            ranked_representatives: [(代表描述, 分数), ...] 按分数降序
+            candidates: 原始候选列表
+            cluster_of: collapse() 返回的簇下标
+        
+        Returns:
+            list: [(描述, 分数), ...] 与 candidates 一一对应的完整排序
+        """
+        members = {}
+        for candidate, cluster in zip(candidates, cluster_of.tolist()):
+            members.setdefault(cluster, []).append(candidate)
+        # 每簇的第一个成员即代表
+        by_representative = {group[0]: group for group in members.values()}
+        
+        ranked = []
+        for representative, score in ranked_representatives:
+            ranked.extend((candidate, score) for candidate in by_representative[representative])
+        return ranked
+    
+    def stats(self):
+        """返回去重统计（节省的文本编码次数 = 候选数 - 代表数）"""
+        return {
+            'candidates': self.num_candidates,
+            'representatives': self.num_representatives,
+            'saved': self.num_candidates - self.num_representatives,
+            'saved_rate': (self.num_candidates - self.num_representatives) / self.num_candidates
+            if self.num_candidates else 0.0,
+        }
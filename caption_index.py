@@ -0,0 +1,141 @@
+"""
+描述检索模块
+功能：以 CLIP 图像特征为键，对已生成描述的图像建立最近邻索引（NumPy 暴力检索），
+      与 output.json 存放在同一目录；新图像与历史图像足够相似时直接复用其描述
+"""
+
+import json
+import os
+
+import numpy as np
+import config
+
+
+class CaptionIndex:
+    """历史描述的图像特征最近邻索引"""
+    
+    MATRIX_FILE = "caption_index.npy"
+    META_FILE = "caption_index.json"
+    
+    def __init__(self, model_name, index_dir=config.OUTPUT_DIR, threshold=config.RETRIEVAL_THRESHOLD):
+        """
+        加载（或新建）索引
+        
+        Args:
+            model_name: CLIP 模型标识（特征与模型绑定，模型不同时不复用旧索引）
+            index_dir: 索引目录（与 output.json 相同）
+            threshold: 余弦相似度达到该值时视为命中
+        """
+        self.model_name = model_name
+        self.threshold = threshold
+        self._matrix_path = os.path.join(index_dir, self.MATRIX_FILE)
+        self._meta_path = os.path.join(index_dir, self.META_FILE)
+        
+        self.queries = 0
+        self.hits = 0
+        self.saved_seconds = 0.0  # 命中条目原本的生成耗时 - 检索耗时
+        
+        self._features = np.zeros((0, 0), dtype=np.float32)  # [N, D] 归一化图像特征
+        self._entries = []   # 与行一一对应：{'image_name', 'caption', 'clip_score', 'time_cost'}
+        self._pending = []   # 尚未合并进矩阵的新特征
+        self._dirty = False
+        self._load()
+        
+        print(f"[检索] 描述索引: {self._matrix_path} ({len(self._entries)} 条)")
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def search(self, feature):
+        """
+        查找最相似的历史图像
+        
+        Args:
+            feature: [D] 归一化图像特征
+        
+        Returns:
+            (similarity, entry): 最高相似度与对应条目；未达到阈值或索引为空时 entry 为 None
+        """
+        self.queries += 1
+        features = self._matrix()
+        if len(features) == 0:
+            return 0.0, None
+        
+        similarity = features @ np.asarray(feature, dtype=np.float32)
+        best = int(similarity.argmax())
+        if similarity[best] < self.threshold:
+            return float(similarity[best]), None
+        self.hits += 1
+        return float(similarity[best]), self._entries[best]
+    
+    def add(self, feature, image_name, caption, clip_score, time_cost):
+        """
+        加入一条新生成的描述
+        
+        Args:
+            feature: [D] 归一化图像特征
+            image_name: 图像名
+            caption: 最佳描述
+            clip_score: 最佳描述的 CLIP 分数
+            time_cost: 完整生成流程耗时（秒），用于估计命中后节省的延迟
+        """
+        self._pending.append(np.asarray(feature, dtype=np.float32))
+        self._entries.append({
+            'image_name': image_name,
+            'caption': caption,
+            'clip_score': float(clip_score),
+            'time_cost': float(time_cost),
+        })
+        self._dirty = True
+    
+    def record_saving(self, entry, lookup_seconds):
+        """记录一次命中节省的耗时"""
+        self.saved_seconds += max(entry['time_cost'] - lookup_seconds, 0.0)
+    
+    def save(self):
+        """写回索引文件"""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self._matrix_path) or ".", exist_ok=True)
+        tmp_path = self._matrix_path + ".tmp.npy"
+        np.save(tmp_path, self._matrix().astype(np.float16))
+        os.replace(tmp_path, self._matrix_path)
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "entries": self._entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path)
+        self._dirty = False
+    
+    def stats(self):
+        """返回命中统计"""
+        return {
+            'queries': self.queries,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.queries if self.queries else 0.0,
+            'saved_seconds': self.saved_seconds,
+            'entries': len(self._entries),
+        }
+    
+    def _matrix(self):
+        """合并新加入的特征后返回完整矩阵"""
+        if self._pending:
+            pending = np.stack(self._pending)
+            self._features = pending if len(self._features) == 0 else np.concatenate([self._features, pending])
+            self._pending = []
+        return self._features
+    
+    def _load(self):
+        if not (os.path.exists(self._matrix_path) and os.path.exists(self._meta_path)):
+            return
+        try:
+            features = np.load(self._matrix_path).astype(np.float32)
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            entries = meta["entries"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # 损坏的索引直接丢弃，之后重新积累
+            return
+        if meta.get("model") != self.model_name or len(features) != len(entries):
+            return
+        self._features = features
+        self._entries = entries
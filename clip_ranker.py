@@ -4,9 +4,11 @@ CLIP 图像-文本匹配模块
 """
 
 import torch
-from PIL import Image
 import numpy as np
 import config
+from image_embedding_store import ImageEmbeddingStore
+from image_frame import as_frame
+from text_embedding_cache import TextEmbeddingCache
 
 # 根据配置选择CLIP模型
 if config.CLIP_MODEL_TYPE == "chinese-clip":
@@ -20,17 +22,30 @@ else:
 class CLIPRanker:
     """CLIP图像-文本匹配排序器"""
     
-    def __init__(self, model_name=config.CLIP_MODEL_NAME):
+    def __init__(
+        self,
+        model_name=config.CLIP_MODEL_NAME,
+        quantize=config.QUANTIZE_INT8,
+        use_text_cache=config.CLIP_TEXT_CACHE_ENABLED,
+        use_image_store=config.CLIP_IMAGE_STORE_ENABLED,
+        dynamic_padding=config.CLIP_DYNAMIC_PADDING
+    ):
         """
         初始化CLIP模型
         
         Args:
             model_name: CLIP模型名称
+            quantize: 是否使用 int8 动态量化模型（仅 CPU）
+            use_text_cache: 是否启用候选文本嵌入缓存
+            use_image_store: 是否启用图像嵌入存储
+            dynamic_padding: 文本编码是否按长度分桶、只填充到批内最长序列
         """
         print(f"[CLIP] 正在加载模型: {model_name}")
         print(f"[CLIP] 模型类型: {config.CLIP_MODEL_TYPE}")
         
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # 动态量化算子只有 CPU 实现
+        self.device = "cuda" if torch.cuda.is_available() and not quantize else "cpu"
+        self.dynamic_padding = dynamic_padding
         print(f"[CLIP] 设备: {self.device}")
         
         if USE_CHINESE_CLIP:
@@ -47,15 +62,27 @@ class CLIPRanker:
                 device=self.device
             )
         
+        if quantize:
+            from quantization import load_quantized_torch
+            print(f"[CLIP] 使用 int8 动态量化模型")
+            self.model = load_quantized_torch(
+                self.model.float(), f"clip_{config.CLIP_MODEL_TYPE}_{model_name}"
+            )
+        
         self.model.eval()
+        
+        # 量化模型的文本特征与 fp32 略有差异，单独做缓存键
+        self.model_tag = f"{config.CLIP_MODEL_TYPE}:{model_name}{':int8' if quantize else ''}"
+        self.text_cache = TextEmbeddingCache(self.model_tag) if use_text_cache else None
+        self.image_store = ImageEmbeddingStore(self.model_tag) if use_image_store else None
         print(f"[CLIP] 模型加载完成")
     
-    def rank_captions(self, image_path, candidates):
+    def rank_captions(self, image, candidates):
         """
         计算相似度并排序候选描述
         
         Args:
-            image_path: 图像文件路径
+            image: 图像文件路径或 ImageFrame
             candidates: 候选描述列表
             
         Returns:
@@ -63,31 +90,7 @@ class CLIPRanker:
         """
         print(f"[CLIP] 正在计算 {len(candidates)} 个候选的相似度...")
         
-        # 加载并预处理图像
-        image = self.preprocess(Image.open(image_path)).unsqueeze(0).to(self.device)
-        
-        # 对文本进行编码
-        if USE_CHINESE_CLIP:
-            text_tokens = tokenize(candidates).to(self.device)
-        else:
-            text_tokens = clip.tokenize(candidates, truncate=True).to(self.device)
-        
-        # 计算特征
-        with torch.no_grad():
-            image_features = self.model.encode_image(image)
-            text_features = self.model.encode_text(text_tokens)
-            
-            # 归一化
-            image_features /= image_features.norm(dim=-1, keepdim=True)
-            text_features /= text_features.norm(dim=-1, keepdim=True)
-            
-            # 计算余弦相似度
-            similarity = (image_features @ text_features.T).squeeze(0)
-            similarity = similarity.cpu().numpy()
-        
-        # 组合结果并排序
-        results = list(zip(candidates, similarity))
-        results.sort(key=lambda x: x[1], reverse=True)
+        results = self.rank_batch([(image, candidates)])[0]
         
         print(f"[CLIP] 相似度计算完成")
         if results:
@@ -97,12 +100,185 @@ class CLIPRanker:
             print(f"       无候选描述可供排序")
         return results
     
-    def get_best_caption(self, image_path, candidates, top_k=1):
+    def rank_batch(
+        self,
+        items,
+        image_batch_size=config.CLIP_IMAGE_BATCH_SIZE,
+        text_batch_size=config.CLIP_TEXT_BATCH_SIZE
+    ):
+        """
+        跨图像批量排序：所有图像按批编码，所有候选文本（去重后）按批编码，
+        再对每张图像取出其候选对应的相似度切片
+        
+        Args:
+            items: [(图像路径或 ImageFrame, 候选描述列表), ...]
+            image_batch_size: 每批编码的图像数量
+            text_batch_size: 每批编码的文本数量
+            
+        Returns:
+            list: 与 items 一一对应的 [(描述, 相似度分数), ...]，各自按分数降序排列
+        """
+        # 相同文本（如多张图像共享的候选）只编码一次
+        texts = list(dict.fromkeys(c for _, candidates in items for c in candidates))
+        if not texts:
+            return [[] for _ in items]
+        text_index = {text: i for i, text in enumerate(texts)}
+        
+        with torch.no_grad():
+            image_features = self._encode_images([image for image, _ in items], image_batch_size)
+            text_features = self._encode_texts(texts, text_batch_size)
+            
+            # 余弦相似度 [num_images, num_texts]
+            similarity = (image_features @ text_features.T).cpu().numpy()
+        
+        outputs = []
+        for row, (_, candidates) in zip(similarity, items):
+            scores = row[[text_index[c] for c in candidates]]
+            results = list(zip(candidates, scores))
+            results.sort(key=lambda x: x[1], reverse=True)
+            outputs.append(results)
+        return outputs
+    
+    def image_features(self, images, batch_size=config.CLIP_IMAGE_BATCH_SIZE):
+        """图像的归一化 CLIP 特征 [N, D] (numpy float32)"""
+        with torch.no_grad():
+            return self._encode_images(list(images), batch_size).cpu().numpy()
+    
+    def text_features(self, texts, batch_size=config.CLIP_TEXT_BATCH_SIZE):
+        """文本的归一化 CLIP 特征 [N, D] (numpy float32)"""
+        with torch.no_grad():
+            return self._encode_texts(list(texts), batch_size).cpu().numpy()
+    
+    def score_store(self, candidates, text_batch_size=config.CLIP_TEXT_BATCH_SIZE):
+        """
+        将一组候选描述与图像嵌入存储中的全部图像打分（一次文本编码 + 一次矩阵乘法）
+        
+        Args:
+            candidates: 候选描述列表
+            text_batch_size: 每批编码的文本数量
+            
+        Returns:
+            (hashes, similarity): 图像内容哈希列表与 [num_images, num_candidates] 余弦相似度
+        """
+        if self.image_store is None:
+            raise RuntimeError("未启用图像嵌入存储 (CLIP_IMAGE_STORE_ENABLED)")
+        hashes, image_features = self.image_store.matrix()
+        if not hashes or not candidates:
+            return hashes, np.zeros((len(hashes), len(candidates)), dtype=np.float32)
+        
+        with torch.no_grad():
+            text_features = self._encode_texts(list(candidates), text_batch_size).cpu().numpy()
+        return hashes, np.asarray(image_features, dtype=np.float32) @ text_features.T
+    
+    def _encode_images(self, images, batch_size):
+        """
+        按批编码图像，返回归一化后的 float32 特征 [N, D]
+        
+        启用图像嵌入存储时先按内容哈希查找，只对未命中的图像运行视觉编码器
+        """
+        frames = [as_frame(image) for image in images]
+        cached = [None] * len(frames)
+        if self.image_store is not None:
+            # 视频帧等一次性图像（无路径）不查询也不写入存储，省去额外的编码与哈希
+            stored = [i for i, frame in enumerate(frames) if frame.path]
+            for i, feature in zip(stored, self.image_store.get_many([frames[i].sha256 for i in stored])):
+                cached[i] = feature
+        missing = [i for i, feature in enumerate(cached) if feature is None]
+        
+        for start in range(0, len(missing), batch_size):
+            chunk = [frames[i] for i in missing[start:start + batch_size]]
+            batch = torch.stack([self.preprocess(frame.pil()) for frame in chunk]).to(self.device)
+            features = self.model.encode_image(batch).float()
+            features = (features / features.norm(dim=-1, keepdim=True)).cpu().numpy()
+            if self.image_store is not None:
+                # 与存储精度一致，保证首次运行与之后命中存储时分数相同
+                features = features.astype(np.float16).astype(np.float32)
+            for i, feature in zip(missing[start:start + batch_size], features):
+                cached[i] = feature
+            if self.image_store is not None:
+                stored = [(frame.sha256, feature) for frame, feature in zip(chunk, features) if frame.path]
+                if stored:
+                    self.image_store.put_many(*zip(*stored))
+        
+        return torch.from_numpy(np.stack(cached)).to(self.device)
+    
+    def _encode_texts(self, texts, batch_size):
+        """
+        编码文本，返回归一化后的 float32 特征 [N, D]
+        
+        启用文本缓存时只对未命中的文本分词、编码，并将结果写回缓存
+        """
+        cached = self.text_cache.get_many(texts) if self.text_cache else [None] * len(texts)
+        missing = [i for i, feature in enumerate(cached) if feature is None]
+        
+        if missing:
+            if USE_CHINESE_CLIP:
+                all_tokens = tokenize([texts[i] for i in missing])
+            else:
+                all_tokens = clip.tokenize([texts[i] for i in missing], truncate=True)
+            
+            order = np.arange(len(missing))
+            if self.dynamic_padding:
+                # 按有效长度分桶：长度相近的候选同批编码，每批只填充到批内最长序列
+                order = np.argsort(_token_lengths(all_tokens).numpy(), kind='stable')
+            
+            for start in range(0, len(order), batch_size):
+                bucket = order[start:start + batch_size]
+                text_tokens = all_tokens[torch.from_numpy(bucket)].to(self.device)
+                if self.dynamic_padding:
+                    text_tokens = text_tokens[:, :int(_token_lengths(text_tokens).max())]
+                    features = self._encode_text_tokens(text_tokens).float()
+                else:
+                    features = self.model.encode_text(text_tokens).float()
+                features = (features / features.norm(dim=-1, keepdim=True)).cpu().numpy()
+                chunk_ids = [missing[j] for j in bucket.tolist()]
+                for i, feature in zip(chunk_ids, features):
+                    cached[i] = feature
+                if self.text_cache is not None:
+                    self.text_cache.put_many([texts[i] for i in chunk_ids], features)
+        
+        return torch.from_numpy(np.stack(cached)).to(self.device)
+    
+    def _encode_text_tokens(self, text_tokens):
+        """
+        编码已截掉尾部填充的 token 序列，结果与完整长度的 encode_text 相同
+        
+        Chinese-CLIP (BERT) 按 [PAD] 生成 attention mask 并取 [CLS] 特征，可直接处理任意长度；
+        OpenAI CLIP 的位置编码与因果 mask 固定为 context_length，这里按实际长度切片后逐层计算，
+        因果 mask 下 EOT 位置之前的输出不受后续填充影响
+        """
+        if USE_CHINESE_CLIP:
+            return self.model.encode_text(text_tokens)
+        
+        model = self.model
+        length = text_tokens.shape[1]
+        x = model.token_embedding(text_tokens).type(model.dtype)
+        x = x + model.positional_embedding[:length].type(model.dtype)
+        x = x.permute(1, 0, 2)  # NLD -> LND
+        attn_mask = model.build_attention_mask()[:length, :length].to(dtype=x.dtype, device=x.device)
+        # 与 ResidualAttentionBlock.forward 相同，只是换成截短后的因果 mask
+        for block in model.transformer.resblocks:
+            h = block.ln_1(x)
+            x = x + block.attn(h, h, h, need_weights=False, attn_mask=attn_mask)[0]
+            x = x + block.mlp(block.ln_2(x))
+        x = x.permute(1, 0, 2)  # LND -> NLD
+        x = model.ln_final(x).type(model.dtype)
+        # 取 EOT（每条序列中 id 最大的 token）位置的特征
+        return x[torch.arange(x.shape[0]), text_tokens.argmax(dim=-1)] @ model.text_projection
+    
+    def flush_cache(self):
+        """将文本嵌入缓存与图像嵌入存储写回磁盘"""
+        if self.text_cache is not None:
+            self.text_cache.flush()
+        if self.image_store is not None:
+            self.image_store.flush()
+    
+    def get_best_caption(self, image, candidates, top_k=1):
         """
         获取最佳描述
         
         Args:
-            image_path: 图像路径
+            image: 图像路径或 ImageFrame
             candidates: 候选列表
             top_k: 返回前k个结果
             
@@ -110,12 +286,91 @@ class CLIPRanker:
             如果top_k=1，返回 (描述, 分数)
             否则返回 [(描述, 分数), ...] 列表
         """
-        ranked = self.rank_captions(image_path, candidates)
+        # 只维护 top-k，不对全部候选排序
+        ranker = self.start_ranking(image, k=top_k)
+        ranker.add(candidates)
+        ranked = ranker.topk()
         
         if top_k == 1:
             return ranked[0]
         else:
-            return ranked[:top_k]
+            return ranked
+    
+    def start_ranking(self, image, k=config.CLIP_INCREMENTAL_TOP_K):
+        """
+        创建增量排序器：图像特征立即计算一次，候选描述之后可分块加入
+        
+        Args:
+            image: 图像路径或 ImageFrame
+            k: 维护的前 k 个结果
+            
+        Returns:
+            IncrementalRanker
+        """
+        return IncrementalRanker(self, image, k)
+
+
+def _token_lengths(text_tokens):
+    """每条 token 序列的有效长度（不含尾部填充）"""
+    if USE_CHINESE_CLIP:
+        # [CLS] ... [SEP] 之后全部为 [PAD] (id 0)
+        return (text_tokens != 0).sum(dim=-1)
+    # OpenAI CLIP：EOT 是词表中 id 最大的 token，其后全部为 0
+    return text_tokens.argmax(dim=-1) + 1
+
+
+class IncrementalRanker:
+    """增量 top-k 排序器：候选描述分块到达时只编码新候选，并合并到当前 top-k"""
+    
+    def __init__(self, ranker, image, k):
+        """
+        Args:
+            ranker: CLIPRanker
+            image: 图像路径或 ImageFrame
+            k: 维护的前 k 个结果
+        """
+        self.ranker = ranker
+        self.k = k
+        self.num_scored = 0
+        with torch.no_grad():
+            self._image_features = ranker._encode_images([image], 1)[0]
+        self._texts = []                   # 当前 top-k 描述（按分数降序）
+        self._scores = torch.empty(0)      # 对应分数（CPU）
+    
+    def add(self, candidates, text_batch_size=config.CLIP_TEXT_BATCH_SIZE):
+        """
+        加入一块新候选并更新 top-k
+        
+        Args:
+            candidates: 新到达的候选描述列表
+            
+        Returns:
+            (描述, 分数): 当前最佳结果，尚无候选时为 None
+        """
+        candidates = list(candidates)
+        if candidates:
+            with torch.no_grad():
+                text_features = self.ranker._encode_texts(candidates, text_batch_size)
+                scores = (text_features @ self._image_features).cpu()
+            
+            # 旧 top-k 与新块合并后再取 top-k（torch.topk 结果按分数降序）
+            texts = self._texts + candidates
+            scores = torch.cat([self._scores, scores])
+            top = torch.topk(scores, min(self.k, len(texts)))
+            self._texts = [texts[i] for i in top.indices.tolist()]
+            self._scores = top.values
+            self.num_scored += len(candidates)
+        return self.best()
+    
+    def best(self):
+        """当前最佳 (描述, 分数)，尚无候选时为 None"""
+        if not self._texts:
+            return None
+        return self._texts[0], self._scores.numpy()[0]
+    
+    def topk(self):
+        """当前 top-k: [(描述, 分数), ...] 按分数降序排列"""
+        return list(zip(self._texts, self._scores.numpy()))
 
 
 # ============ 测试代码 ============
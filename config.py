@@ -10,6 +10,27 @@ import os
 YOLO_MODEL = "yolov8n.pt"  # 可选: yolov8s.pt, yolov8m.pt
 YOLO_CONF_THRESHOLD = 0.25  # 置信度阈值
 YOLO_IOU_THRESHOLD = 0.45   # NMS IoU阈值
+YOLO_IMGSZ = 640            # 推理输入尺寸
+YOLO_BACKEND = "torch"      # 推理后端: "torch"（ultralytics PyTorch）或 "onnx"（ONNX Runtime CPU）
+YOLO_ONNX_DIR = "models"    # ONNX 导出文件缓存目录（YOLO_BACKEND = "onnx" 时使用）
+
+# 切片推理（高分辨率图像：切成重叠图块分别检测，再全局 NMS 合并）
+YOLO_TILED = False          # 是否默认使用切片推理
+YOLO_TILE_SIZE = 640        # 图块边长（像素）
+YOLO_TILE_OVERLAP = 0.2     # 相邻图块重叠比例
+YOLO_TILE_WORKERS = 0       # >1 时用线程池并行推理图块（仅 onnx 后端），否则图块作为一个 batch 推理
+YOLO_TILE_INCLUDE_FULL = True  # 是否额外做一次整图推理，补充跨图块的大物体
+# 自适应分辨率（先低分辨率推理，小物体/低置信度框较多时再以 YOLO_IMGSZ 重新推理）
+YOLO_ADAPTIVE = False             # 是否默认使用自适应分辨率
+YOLO_ADAPTIVE_LOW_IMGSZ = 320     # 低分辨率预检的输入尺寸
+YOLO_ADAPTIVE_SMALL_AREA = 0.01   # 面积占画面比例低于该值的框视为小物体
+YOLO_ADAPTIVE_LOW_CONF = 0.5      # 置信度低于该值的框视为低置信度
+YOLO_ADAPTIVE_RERUN_COUNT = 3     # 小物体/低置信度框达到该数量时重新推理
+YOLO_ADAPTIVE_RERUN_RATIO = 0.5   # 或占全部框的比例达到该值时重新推理
+YOLO_BATCH_SIZE = 8         # 批量检测时每批送入模型的图像数量
+YOLO_CACHE_ENABLED = True   # 是否启用检测结果磁盘缓存（按图像内容 + 上述参数做键）
+YOLO_CACHE_DIR = "cache/detections"  # 检测缓存目录
+YOLO_CACHE_MAX_ENTRIES = 10000       # 缓存条目上限，超出后按 LRU 淘汰
 
 # LLM 配置 (Qwen)
 LLM_USE_API = True  # 是否使用API调用（True）还是本地模型（False）
@@ -35,11 +56,55 @@ LLM_MAX_LENGTH = 2048
 LLM_TEMPERATURE = 0.9  # 增加多样性以提升 CLIP 挑选范围
 LLM_TOP_P = 0.9
 LLM_TOP_K = 50
+LLM_CONCURRENCY = 8  # 目录模式下同时在途的 LLM 请求数上限（asyncio 并发，本地模型固定为 1）
+LLM_STREAM = False   # 流式生成（仅 OpenAI 兼容 API）：边接收边解析候选，凑满候选数后立即停止生成
+LLM_CACHE_ENABLED = False                   # 是否启用响应缓存（按 模型 + 提示词 + 图像内容 + 采样参数 + 轮次 做键；命中时不再重新采样）
+LLM_CACHE_PATH = "cache/llm_responses.sqlite"  # SQLite 数据库路径
+LLM_CACHE_MAX_MB = 200                      # 响应总大小上限（MB），超出后按最久未使用淘汰
+LLM_CACHE_TTL_DAYS = 30                     # 条目有效期（天），0 表示不过期
+LLM_CACHE_EPOCH = 0                         # 缓存轮次：修改后旧响应不再命中（同一提示词重新采样）
+
+# 图像上传负载：上传前缩放并重新编码，减小请求体（LLMGenerator 与 baseline.py 共用）
+LLM_IMAGE_MAX_SIDE = 1280   # 最长边上限（像素），0 表示上传原始文件字节
+LLM_IMAGE_FORMAT = "jpeg"   # 重新编码格式: "jpeg" 或 "webp"
+LLM_IMAGE_QUALITY = 85      # 编码质量 (1-100)
+LLM_UPLOAD_MBPS = 10.0      # 估计节省的上传耗时所用的上行带宽（Mbit/s）
+
+# API 限流与重试：在途请求数按 AIMD 自适应调整（不超过 LLM_CONCURRENCY）
+LLM_AIMD_INITIAL = 4        # 初始并发上限
+LLM_AIMD_MIN = 1            # 并发上限的最小值
+LLM_AIMD_DECREASE = 0.5     # 收到 429 或延迟超标时的乘性减小系数
+LLM_TARGET_P95 = 30.0       # 最近请求延迟 p95 超过该值（秒）时视为过载
+LLM_LATENCY_WINDOW = 20     # 计算 p95 的滑动窗口（请求数）
+LLM_MAX_RETRIES = 5         # 429 / 5xx / 网络错误的最大重试次数
+LLM_BACKOFF_BASE = 1.0      # 第 n 次重试前随机等待 [0, base * 2^n] 秒（服务端给出 Retry-After 时以其为准）
+LLM_BACKOFF_MAX = 30.0      # 单次等待上限（秒）
+
+# HTTP 连接池（LLMGenerator 与 baseline.py 共享，复用 TCP/TLS 连接）
+LLM_HTTP_MAX_CONNECTIONS = 16       # 连接池最大连接数（不低于 LLM_CONCURRENCY）
+LLM_HTTP_MAX_KEEPALIVE = 16         # 空闲时保持的长连接数
+LLM_HTTP_KEEPALIVE_EXPIRY = 120.0   # 空闲长连接的保留时间（秒）
+LLM_HTTP_CONNECT_TIMEOUT = 10.0     # 建立连接超时（秒）
+LLM_HTTP_TIMEOUT = 180.0            # 读写超时（秒，VL 模型生成较慢）
 
 # CLIP 配置
 CLIP_MODEL_TYPE = "chinese-clip"  # 修改为 openai-clip（因为 chinese-clip 在 Windows 编译失败）
 CLIP_MODEL_NAME = "ViT-B-16"  # OpenAI CLIP 模型
 CLIP_DOWNLOAD_ROOT = "models"  # clip 模型下载路径，如果没有会创造该路径
+CLIP_IMAGE_BATCH_SIZE = 32     # 跨图像批量排序时每批编码的图像数量
+CLIP_TEXT_BATCH_SIZE = 256     # 每批编码的候选文本数量
+BASELINE_SCORE_BATCH_SIZE = 4  # baseline.py 每生成多少张图像的描述做一次 CLIP 批量评分并保存（中断时最多丢失该数量减一的结果）
+CLIP_INCREMENTAL_TOP_K = 5     # 增量排序时维护的前 k 个结果
+CLIP_DYNAMIC_PADDING = True    # 文本编码按长度分桶，每批只填充到批内最长序列（而非 context_length）
+CLIP_TEXT_CACHE_ENABLED = True          # 是否启用候选文本嵌入缓存（按 归一化文本 + 模型名 做键）
+CLIP_TEXT_CACHE_DIR = "cache/clip_text"  # 持久化目录，设为 None 时只在内存中缓存
+CLIP_TEXT_CACHE_MAX_ENTRIES = 50000      # 缓存条目上限，超出后按 LRU 淘汰
+CLIP_IMAGE_STORE_ENABLED = True           # 是否启用图像嵌入存储（内存映射 float16 矩阵，按图像内容哈希索引）
+CLIP_IMAGE_STORE_DIR = "cache/clip_images"  # 图像嵌入存储目录
+
+# Int8 动态量化（仅 CPU：YOLO 使用量化后的 ONNX 模型，CLIP 量化全部 Linear 层）
+QUANTIZE_INT8 = False                 # 是否启用 int8 量化模式
+QUANTIZED_MODEL_DIR = "models/int8"   # 量化模型缓存目录
 
 # ============ 生成配置 ============
 
@@ -48,32 +113,66 @@ NUM_CANDIDATES = 20  # 大幅增加候选数量以提高 CLIP 选优概率
 MAX_CAPTION_LENGTH = 100  # 字幕最大长度（字）
 MIN_CAPTION_LENGTH = 20   # 降低最小长度限制，避免 LLM 为了凑字数产生废话
 
+# 近重复候选去重（CLIP 只为每簇代表编码打分）
+DEDUP_ENABLED = True                # 是否在 CLIP 排序前合并近重复候选
+DEDUP_NGRAM = 2                     # 字符 n-gram 长度（去掉标点与空白后计算）
+DEDUP_SIMILARITY_THRESHOLD = 0.75   # MinHash 估计的 Jaccard 相似度达到该值视为近重复
+DEDUP_NUM_PERM = 128                # MinHash 置换数量
+
+# 检索快速通道（与历史图像足够相似时直接复用其描述，跳过 YOLO→LLM→CLIP）
+RETRIEVAL_ENABLED = False     # 是否默认启用（11.py 可用 --retrieval 开启）
+RETRIEVAL_THRESHOLD = 0.95    # CLIP 图像特征余弦相似度达到该值视为同一画面
+
+# 输入目录重复图像预扫描（感知哈希，每组只运行一次流水线）
+IMAGE_DEDUP_ENABLED = False    # 目录模式下是否默认去重（11.py / baseline.py 用 --dedup 开启；重复图像复用代表图像的结果）
+IMAGE_DEDUP_MAX_DISTANCE = 4   # aHash 与 dHash 的汉明距离都不超过该值视为重复 (0-64)
+IMAGE_DEDUP_WORKERS = 8        # 计算哈希的线程数
+
+# ============ 视频 / 帧流配置 ============
+
+VIDEO_FRAME_STRIDE = 1            # 每隔多少帧取一帧做场景判断
+VIDEO_SCENE_THRESHOLD = 0.3       # 与上一关键帧的直方图距离超过该值视为场景切换 (0-1)
+VIDEO_MAX_KEYFRAME_INTERVAL = 0   # 距上一关键帧超过该帧数时强制重新描述（0 表示不限制）
+
 # ============ 位置映射 ============
 
 # 将边界框坐标映射为位置描述
+POSITION_THRESHOLDS = (0.33, 0.67)  # 水平/垂直方向的三等分界线
+H_POSITION_NAMES = ("画面左侧", "画面中央", "画面右侧")
+V_POSITION_NAMES = ("上方", "中部", "下方")
+
 def get_position_description(x_center, y_center):
     """
     根据物体中心坐标返回位置描述
     x_center, y_center: 归一化坐标 (0-1)
     """
     # 水平位置
-    if x_center < 0.33:
-        h_pos = "画面左侧"
-    elif x_center < 0.67:
-        h_pos = "画面中央"
+    if x_center < POSITION_THRESHOLDS[0]:
+        h_pos = H_POSITION_NAMES[0]
+    elif x_center < POSITION_THRESHOLDS[1]:
+        h_pos = H_POSITION_NAMES[1]
     else:
-        h_pos = "画面右侧"
+        h_pos = H_POSITION_NAMES[2]
     
     # 垂直位置
-    if y_center < 0.33:
-        v_pos = "上方"
-    elif y_center < 0.67:
-        v_pos = "中部"
+    if y_center < POSITION_THRESHOLDS[0]:
+        v_pos = V_POSITION_NAMES[0]
+    elif y_center < POSITION_THRESHOLDS[1]:
+        v_pos = V_POSITION_NAMES[1]
     else:
-        v_pos = "下方"
+        v_pos = V_POSITION_NAMES[2]
     
     return f"{h_pos}{v_pos}"
 
+# ============ 空间关系 ============
+
+SPATIAL_NEAR_SCALE = 1.0       # 中心距离小于 两框对角线均值 × 该系数 视为"靠近"
+SPATIAL_OVERLAP_IOU = 0.1      # IoU 超过该值视为相互遮挡
+SPATIAL_CONTAIN_RATIO = 0.8    # 小框有该比例以上面积落在大框内视为"在…上/范围内"
+SPATIAL_MAX_RELATIONS = 8      # 写入提示词的关系条数上限
+SPATIAL_GRID_MIN_BOXES = 64    # 检测框数超过该值时使用网格索引，避免 N×N 全量比较
+SPATIAL_SUPPORT_OBJECTS = {'dining table', 'bed', 'couch', 'bench', 'chair', 'surfboard', 'skateboard'}
+
 # ============ YOLO 类别中文映射 ============
 
 # COCO 80类的中文翻译
@@ -111,6 +210,7 @@ PROMPT_TEMPLATE = """你是一个专业的图像描述专家。请结合你观
 ## 视觉辅助数据 (YOLO检测)
 - 物体与数量：{objects} ({counts})
 - 大致位置：{positions}
+- 空间关系：{relations}
 - 场景推断：{scene}
 
 ## 任务要求：
@@ -149,6 +249,10 @@ def classify_scene(objects):
     indoor_count = sum(1 for obj in objects if obj in INDOOR_OBJECTS)
     outdoor_count = sum(1 for obj in objects if obj in OUTDOOR_OBJECTS)
     
+    return scene_from_counts(indoor_count, outdoor_count)
+
+def scene_from_counts(indoor_count, outdoor_count):
+    """根据室内/室外物体计数推断场景类型"""
     if indoor_count > outdoor_count:
         return "室内"
     elif outdoor_count > indoor_count:
@@ -0,0 +1,161 @@
+"""
+YOLO 检测结果缓存模块
+功能：按 图像内容哈希 + 检测参数 将紧凑的检测框缓存到磁盘，重复运行时跳过 YOLO 推理
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+import config
+
+
+class DetectionCache:
+    """YOLO 检测结果磁盘缓存（LRU 淘汰）"""
+    
+    INDEX_FILE = "index.json"
+    
+    def __init__(
+        self,
+        model_name=config.YOLO_MODEL,
+        cache_dir=config.YOLO_CACHE_DIR,
+        max_entries=config.YOLO_CACHE_MAX_ENTRIES
+    ):
+        """
+        初始化缓存
+        
+        Args:
+            model_name: YOLO模型名称（参与缓存键计算）
+            cache_dir: 缓存目录
+            max_entries: 最多保留的条目数，超出后淘汰最久未使用的条目
+        """
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index_path = os.path.join(cache_dir, self.INDEX_FILE)
+        self._lru = OrderedDict()  # key -> None，按访问时间从旧到新排列
+        self._dirty = False
+        self._load_index()
+        
+        print(f"[YOLO] 检测缓存: {cache_dir} ({len(self._lru)} 条)")
+    
+    def make_key(self, content_hash, variant=""):
+        """
+        缓存键：图像内容哈希 + 模型 + 推理输入尺寸 + 置信度阈值 + NMS IoU阈值
+        
+        YOLO_IMGSZ 同时决定 ONNX 后端的导出尺寸，修改后旧结果不再命中
+        
+        Args:
+            content_hash: 图像内容哈希（ImageFrame.sha256）
+            variant: 推理方式标识（如切片推理的参数），默认整图推理为空
+        """
+        settings = (
+            f"{content_hash}|{self.model_name}|{config.YOLO_IMGSZ}"
+            f"|{config.YOLO_CONF_THRESHOLD}|{config.YOLO_IOU_THRESHOLD}"
+        )
+        if variant:
+            settings += f"|{variant}"
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+    
+    def get(self, key):
+        """
+        查询缓存
+        
+        Returns:
+            (data, orig_shape) 或 None
+            data: [N, 6] float32 数组 = x1, y1, x2, y2, conf, cls
+            orig_shape: 原图尺寸 (height, width)
+        """
+        path = self._entry_path(key)
+        if key not in self._lru or not os.path.exists(path):
+            self._lru.pop(key, None)
+            self.misses += 1
+            return None
+        
+        try:
+            with np.load(path) as entry:
+                data = entry["data"]
+                orig_shape = tuple(int(v) for v in entry["orig_shape"])
+        except (OSError, ValueError, KeyError):
+            # 损坏的条目直接丢弃
+            self._remove(key)
+            self.misses += 1
+            return None
+        
+        self._lru.move_to_end(key)
+        self._dirty = True
+        self.hits += 1
+        return data, orig_shape
+    
+    def put(self, key, data, orig_shape):
+        """写入一条检测结果（data 格式同 get()）"""
+        path = self._entry_path(key)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                data=np.asarray(data, dtype=np.float32).reshape(-1, 6),
+                orig_shape=np.asarray(orig_shape, dtype=np.int64)
+            )
+        os.replace(tmp_path, path)
+        
+        self._lru[key] = None
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            old_key, _ = self._lru.popitem(last=False)
+            self._remove(old_key)
+            self.evictions += 1
+        
+        self._dirty = True
+        self.flush()
+    
+    def flush(self):
+        """将 LRU 顺序写回索引文件"""
+        if not self._dirty:
+            return
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"order": list(self._lru)}, f)
+        os.replace(tmp_path, self._index_path)
+        self._dirty = False
+    
+    def stats(self):
+        """返回命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._lru),
+        }
+    
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+    
+    def _remove(self, key):
+        self._lru.pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+        self._dirty = True
+    
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                order = json.load(f).get("order", [])
+        except (OSError, ValueError):
+            order = []
+        for key in order:
+            self._lru[key] = None
@@ -0,0 +1,84 @@
+"""
+紧凑检测结果模块
+功能：以数组形式保存单张图像的检测框，替代在流水线中长期持有 ultralytics Results（含原图）
+"""
+
+import numpy as np
+
+
+class Detections:
+    """单张图像的检测结果（xyxy / cls / conf 数组 + 图像尺寸）"""
+    
+    __slots__ = ('xyxy', 'cls', 'conf', 'orig_shape', 'names', 'path')
+    
+    def __init__(self, xyxy, cls, conf, orig_shape, names, path=None):
+        """
+        Args:
+            xyxy: [N, 4] float32 边界框，原图坐标
+            cls: [N] int64 类别ID
+            conf: [N] float32 置信度
+            orig_shape: 原图尺寸 (height, width)
+            names: 类别ID -> 英文类别名 的字典（与模型共享，不复制）
+            path: 图像路径（绘制时用于重新读取原图）
+        """
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.cls = np.asarray(cls, dtype=np.int64).reshape(-1)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.orig_shape = (int(orig_shape[0]), int(orig_shape[1]))
+        self.names = names
+        self.path = path
+    
+    @classmethod
+    def from_array(cls, data, orig_shape, names, path=None):
+        """从 [N, 6] 数组 (x1, y1, x2, y2, conf, cls) 构建"""
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+        return cls(data[:, :4], data[:, 5], data[:, 4], orig_shape, names, path)
+    
+    @classmethod
+    def from_results(cls, result):
+        """从单张图像的 ultralytics Results 构建（一次性拷贝到主机）"""
+        # [N, 6] 或跟踪模式下的 [N, 7]，conf/cls 总在最后两列
+        data = result.boxes.data.cpu().numpy()
+        return cls(
+            data[:, :4], data[:, -1], data[:, -2],
+            result.orig_shape, result.names, result.path
+        )
+    
+    def to_array(self):
+        """转为 [N, 6] 数组 (x1, y1, x2, y2, conf, cls)"""
+        return np.column_stack([
+            self.xyxy, self.conf, self.cls.astype(np.float32)
+        ]).astype(np.float32)
+    
+    def __len__(self):
+        return len(self.cls)
+    
+    def __repr__(self):
+        return f"Detections(n={len(self)}, orig_shape={self.orig_shape}, path={self.path!r})"
+    
+    def plot(self, image=None):
+        """
+        绘制检测框（样式与 ultralytics Results.plot() 一致）
+        
+        Args:
+            image: BGR 原图数组；为空时从 self.path 读取
+            
+        Returns:
+            np.ndarray: 绘制后的 BGR 图像
+        """
+        import torch
+        from ultralytics.engine.results import Results
+        
+        if image is None:
+            import cv2
+            image = cv2.imread(self.path)
+            if image is None:
+                raise FileNotFoundError(f"无法读取图像: {self.path}")
+        
+        # 仅在绘制时临时构建 Results，绘制完即释放
+        return Results(
+            image,
+            path=self.path,
+            names=self.names,
+            boxes=torch.from_numpy(self.to_array())
+        ).plot()
@@ -0,0 +1,161 @@
+"""
+图像去重模块
+功能：用感知哈希（aHash + dHash）在线程池中快速扫描输入目录，
+      以 BK-tree 按汉明距离聚类完全相同或缩放后的重复图像；
+      每组只运行一次流水线，再将结果写给组内所有图像
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import config
+
+
+def _bits_to_int(bits):
+    """布尔数组 -> 整数哈希"""
+    return int(np.packbits(bits.ravel()).view(">u8")[0])
+
+
+def perceptual_hash(image_path):
+    """
+    计算图像的 (aHash, dHash)，各 64 位
+    
+    直接以 1/8 尺寸解码灰度图（JPEG 可在 DCT 阶段缩小），只读取少量像素
+    
+    Returns:
+        (ahash, dhash)，无法解码时返回 None
+    """
+    gray = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+    # aHash：8x8 均值图与整体均值比较
+    small = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32)
+    ahash = _bits_to_int(small > small.mean())
+    # dHash：9x8 图中水平相邻像素的明暗关系
+    wide = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    dhash = _bits_to_int(wide[:, 1:] > wide[:, :-1])
+    return ahash, dhash
+
+
+def hamming(a, b):
+    """两个 64 位哈希的汉明距离"""
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """按汉明距离组织的 BK-tree，支持半径查询"""
+    
+    def __init__(self):
+        self._root = None  # 节点: [哈希, 值, {距离: 子节点}]
+    
+    def add(self, key, value):
+        node = [key, value, {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(key, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+    
+    def query(self, key, radius):
+        """返回 [(距离, 值), ...]：所有与 key 的距离不超过 radius 的条目"""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_key, value, children = stack.pop()
+            distance = hamming(key, node_key)
+            if distance <= radius:
+                found.append((distance, value))
+            # 三角不等式：只有距离在 [d - r, d + r] 内的子树可能包含结果
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def group_duplicates(
+    image_paths,
+    max_distance=config.IMAGE_DEDUP_MAX_DISTANCE,
+    workers=config.IMAGE_DEDUP_WORKERS
+):
+    """
+    将重复图像分组
+    
+    dHash 距离不超过 max_distance 的图像为候选重复，再要求 aHash 距离同样不超过 max_distance
+    
+    Args:
+        image_paths: 图像路径列表（按处理顺序）
+        max_distance: 视为重复的最大汉明距离
+        workers: 计算哈希的线程数
+    
+    Returns:
+        dict: {代表图像路径: [组内全部图像路径（含代表）]}，按 image_paths 的顺序，代表为组内最先出现的图像
+    """
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        hashes = list(pool.map(perceptual_hash, image_paths))
+    
+    tree = BKTree()
+    groups = {}
+    for path, hash_pair in zip(image_paths, hashes):
+        if hash_pair is None:
+            # 无法解码的图像单独成组，交给流水线按原逻辑报错
+            groups[path] = [path]
+            continue
+        ahash, dhash = hash_pair
+        matches = [
+            (distance, leader) for distance, (leader, leader_ahash) in tree.query(dhash, max_distance)
+            if hamming(ahash, leader_ahash) <= max_distance
+        ]
+        if matches:
+            groups[min(matches)[1]].append(path)
+        else:
+            tree.add(dhash, (path, ahash))
+            groups[path] = [path]
+    
+    num_duplicates = len(image_paths) - len(groups)
+    print(f"[去重] {len(image_paths)} 张图像 -> {len(groups)} 组 (重复 {num_duplicates} 张)")
+    return groups
+
+
+def fan_out_results(output_json_path, groups, image_name):
+    """
+    将每组代表图像在结果 JSON 中的条目复制给组内其他图像
+    
+    Args:
+        output_json_path: 结果文件（条目列表，每条含 "image_name"）
+        groups: group_duplicates() 的返回值
+        image_name: 图像路径 -> 结果中 image_name 的函数
+    """
+    duplicates = {leader: members[1:] for leader, members in groups.items() if len(members) > 1}
+    if not duplicates or not os.path.exists(output_json_path):
+        return
+    
+    with open(output_json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    items = {item.get("image_name"): item for item in data}
+    
+    for leader, members in duplicates.items():
+        leader_item = items.get(image_name(leader))
+        if leader_item is None:
+            continue
+        for member in members:
+            item = dict(leader_item, image_name=image_name(member), duplicate_of=leader_item["image_name"])
+            if item["image_name"] in items:
+                data[data.index(items[item["image_name"]])] = item
+            else:
+                data.append(item)
+            items[item["image_name"]] = item
+    
+    with open(output_json_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    print(f"[去重] 已将结果写给 {sum(len(m) for m in duplicates.values())} 张重复图像")
@@ -0,0 +1,144 @@
+"""
+CLIP 图像嵌入存储模块
+功能：将图像特征持久化为内存映射的 float16 矩阵 (.npy) + 内容哈希 -> 行号 索引 (.json)，
+      重复评估同一批图像时无需再次运行 CLIP 视觉编码器
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+import config
+
+
+def _close_memmap(array):
+    """刷新并关闭内存映射（Windows 上仍被映射的文件无法替换或删除）；调用方不得再持有其视图"""
+    array.flush()
+    mapping = getattr(array, "_mmap", None)
+    if mapping is not None:
+        mapping.close()
+
+
+class ImageEmbeddingStore:
+    """内存映射的图像嵌入存储（每个 CLIP 模型一对 .npy / .json 文件）"""
+    
+    def __init__(self, model_name, store_dir=config.CLIP_IMAGE_STORE_DIR):
+        """
+        打开（或新建）存储
+        
+        Args:
+            model_name: CLIP 模型标识（不同模型使用不同文件）
+            store_dir: 存储目录
+        """
+        safe_name = re.sub(r"[^\w.-]", "_", model_name)
+        self._matrix_path = os.path.join(store_dir, f"{safe_name}.npy")
+        self._index_path = os.path.join(store_dir, f"{safe_name}.json")
+        
+        self.hits = 0
+        self.misses = 0
+        
+        os.makedirs(store_dir, exist_ok=True)
+        self._rows = {}        # 内容哈希 -> 行号
+        self._matrix = None    # [capacity, D] float16 内存映射，前 len(self._rows) 行有效
+        self._dirty = False
+        self._load()
+        
+        print(f"[CLIP] 图像嵌入存储: {self._matrix_path} ({len(self._rows)} 张)")
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    def get_many(self, hashes):
+        """
+        批量查询图像特征
+        
+        Returns:
+            list: 与 hashes 一一对应的 [D] float32 归一化特征，未命中为 None
+        """
+        features = []
+        for content_hash in hashes:
+            row = self._rows.get(content_hash)
+            if row is None:
+                self.misses += 1
+                features.append(None)
+            else:
+                self.hits += 1
+                features.append(self._matrix[row].astype(np.float32))
+        return features
+    
+    def put_many(self, hashes, features):
+        """追加多张图像的特征（features: [N, D] 归一化特征），已存在的哈希直接覆盖"""
+        features = np.asarray(features, dtype=np.float16)
+        self._reserve(len(self._rows) + len(hashes), features.shape[1])
+        for content_hash, feature in zip(hashes, features):
+            row = self._rows.setdefault(content_hash, len(self._rows))
+            self._matrix[row] = feature
+        self._dirty = True
+    
+    def matrix(self):
+        """
+        全部已存储的特征
+        
+        Returns:
+            (hashes, features): 内容哈希列表与对应的 [N, D] float16 特征副本（行顺序一致）；
+                                返回副本而非内存映射视图，扩容时旧映射可以安全关闭
+        """
+        hashes = list(self._rows)
+        if self._matrix is None:
+            return hashes, np.zeros((0, 0), dtype=np.float16)
+        return hashes, np.array(self._matrix[:len(hashes)])
+    
+    def flush(self):
+        """将矩阵与索引写回磁盘"""
+        if not self._dirty:
+            return
+        self._matrix.flush()
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self._matrix.shape[1], "rows": self._rows}, f)
+        os.replace(tmp_path, self._index_path)
+        self._dirty = False
+    
+    def stats(self):
+        """返回命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._rows),
+        }
+    
+    def _reserve(self, num_rows, dim):
+        """确保矩阵容量至少为 num_rows 行（按倍数扩容，重新映射文件）"""
+        if self._matrix is not None and len(self._matrix) >= num_rows:
+            return
+        capacity = max(num_rows, 2 * len(self._matrix) if self._matrix is not None else 1024)
+        tmp_path = self._matrix_path + ".tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(capacity, dim))
+        if self._matrix is not None:
+            grown[:len(self._rows)] = self._matrix[:len(self._rows)]
+        _close_memmap(grown)
+        del grown
+        # 替换前关闭旧映射，否则 Windows 上 os.replace 会报 PermissionError
+        if self._matrix is not None:
+            _close_memmap(self._matrix)
+            self._matrix = None
+        os.replace(tmp_path, self._matrix_path)
+        self._matrix = np.load(self._matrix_path, mmap_mode="r+")
+    
+    def _load(self):
+        if not (os.path.exists(self._index_path) and os.path.exists(self._matrix_path)):
+            return
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                rows = json.load(f).get("rows", {})
+            matrix = np.load(self._matrix_path, mmap_mode="r+")
+        except (OSError, ValueError):
+            # 损坏的存储直接丢弃，之后重新编码
+            return
+        if rows and max(rows.values()) >= len(matrix):
+            return
+        self._rows = rows
+        self._matrix = matrix
@@ -0,0 +1,105 @@
+"""
+图像帧模块
+功能：每张图像只读盘、解码一次，在 YOLO / CLIP / LLM 各阶段之间共享字节与解码结果
+"""
+
+import hashlib
+import os
+
+import cv2
+import numpy as np
+
+
+class ImageFrame:
+    """内存中的图像帧：原始字节 + 解码后的数组 + 派生视图（均按需计算并缓存）"""
+    
+    __slots__ = ('path', 'label', '_data', '_bgr', '_pil', '_sha256', 'cache')
+    
+    def __init__(self, path=None, data=None, bgr=None, label=None):
+        """
+        Args:
+            path: 图像文件路径（字节按需读取）
+            data: 已编码的图像字节（如 JPEG）
+            bgr: 已解码的 BGR 数组（如视频帧），字节按需编码为 JPEG
+            label: 日志中显示的名称（默认为 path）
+        """
+        if path is None and data is None and bgr is None:
+            raise ValueError("ImageFrame 需要 path、data 或 bgr 之一")
+        self.path = path
+        self.label = label if label is not None else path
+        self._data = data
+        self._bgr = bgr
+        self._pil = None
+        self._sha256 = None
+        self.cache = {}  # 各阶段的派生结果（如 LLM 上传负载）
+    
+    @property
+    def name(self):
+        """图像名（不含扩展名）"""
+        if self.path is None:
+            return self.sha256[:16]
+        return os.path.splitext(os.path.basename(self.path))[0]
+    
+    @property
+    def data(self):
+        """原始编码字节（只读盘一次）"""
+        if self._data is None:
+            if self.path is not None:
+                with open(self.path, "rb") as f:
+                    self._data = f.read()
+            else:
+                ok, encoded = cv2.imencode(".jpg", self._bgr)
+                if not ok:
+                    raise ValueError("图像编码失败")
+                self._data = encoded.tobytes()
+        return self._data
+    
+    @property
+    def bgr(self):
+        """解码后的 BGR 数组（只解码一次，供 YOLO 与绘制使用）"""
+        if self._bgr is None:
+            self._bgr = cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if self._bgr is None:
+                raise ValueError(f"无法解码图像: {self.path}")
+        return self._bgr
+    
+    @property
+    def rgb(self):
+        """RGB 视图（不复制）"""
+        return self.bgr[..., ::-1]
+    
+    @property
+    def shape(self):
+        """图像尺寸 (height, width)"""
+        return self.bgr.shape[:2]
+    
+    @property
+    def mime(self):
+        """上传时使用的 MIME 类型"""
+        if self.path is None:
+            return "image/jpeg"
+        return f"image/{self.path.split('.')[-1]}"
+    
+    @property
+    def sha256(self):
+        """图像内容哈希（用作各类缓存键）"""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+    
+    def pil(self):
+        """PIL RGB 图像（供 CLIP 预处理与 matplotlib 显示）"""
+        if self._pil is None:
+            from PIL import Image
+            self._pil = Image.fromarray(np.ascontiguousarray(self.rgb))
+        return self._pil
+    
+    def __repr__(self):
+        return f"ImageFrame({self.label!r})"
+
+
+def as_frame(image):
+    """将图像路径或 ImageFrame 统一为 ImageFrame"""
+    if isinstance(image, ImageFrame):
+        return image
+    return ImageFrame(path=os.fspath(image))
@@ -0,0 +1,127 @@
+"""
+LLM 图像上传负载模块
+功能：上传前将图像缩放到最长边不超过 LLM_IMAGE_MAX_SIDE，并按设定质量重新编码为 JPEG / WebP，
+      结果缓存在 ImageFrame.cache 中（重试、流式与批量路径复用同一份编码结果）；
+      统计上传字节数，并按上行带宽估计节省的上传耗时
+"""
+
+import base64
+import threading
+import time
+
+import cv2
+import config
+from image_frame import as_frame
+
+_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+# 文件头 -> MIME 类型（上传原始字节时使用，不依赖扩展名）
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def sniff_mime(data, default="image/jpeg"):
+    """按文件头判断图像的 MIME 类型"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime in _SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    return default
+
+
+class PayloadStats:
+    """上传负载统计（原始字节 vs 实际上传字节）"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.original_bytes = 0
+        self.uploaded_bytes = 0
+        self.encode_seconds = 0.0
+    
+    def record(self, original_bytes, uploaded_bytes, encode_seconds):
+        with self._lock:
+            self.images += 1
+            self.original_bytes += original_bytes
+            self.uploaded_bytes += uploaded_bytes
+            self.encode_seconds += encode_seconds
+    
+    def stats(self, upload_mbps=config.LLM_UPLOAD_MBPS):
+        """
+        返回负载统计
+        
+        节省的上传耗时 = 少上传的 base64 字节 / 上行带宽 - 缩放与编码耗时（每张图像只计一次）
+        """
+        with self._lock:
+            saved_bytes = self.original_bytes - self.uploaded_bytes
+            # base64 使请求体膨胀为 4/3
+            saved_upload = saved_bytes * 4 / 3 * 8 / (upload_mbps * 1e6)
+            return {
+                'images': self.images,
+                'original_mb': self.original_bytes / (1024 * 1024),
+                'uploaded_mb': self.uploaded_bytes / (1024 * 1024),
+                'reduction': saved_bytes / self.original_bytes if self.original_bytes else 0.0,
+                'encode_seconds': self.encode_seconds,
+                'saved_seconds': saved_upload - self.encode_seconds,
+            }
+
+
+payload_stats = PayloadStats()
+
+
+def prepare_payload(
+    image,
+    max_side=config.LLM_IMAGE_MAX_SIDE,
+    fmt=config.LLM_IMAGE_FORMAT,
+    quality=config.LLM_IMAGE_QUALITY
+):
+    """
+    准备图像上传负载
+    
+    最长边超过 max_side 时按比例缩小并重新编码；未缩放且重新编码不能减小体积时上传原始字节
+    
+    Args:
+        image: 图像路径或 ImageFrame
+        max_side: 最长边上限（像素），0 表示直接上传原始字节
+        fmt: 重新编码格式，"jpeg" 或 "webp"
+        quality: 编码质量 (1-100)
+    
+    Returns:
+        (mime, b64): MIME 类型与 base64 字符串
+    """
+    frame = as_frame(image)
+    cache_key = ("llm_payload", max_side, fmt, quality)
+    payload = frame.cache.get(cache_key)
+    if payload is not None:
+        return payload
+    
+    t0 = time.perf_counter()
+    original = frame.data
+    mime, data = sniff_mime(original, frame.mime), original
+    if max_side:
+        ext, encoded_mime, quality_flag = _FORMATS[fmt]
+        bgr = frame.bgr
+        height, width = bgr.shape[:2]
+        scale = max_side / max(height, width)
+        if scale < 1:
+            size = (max(round(width * scale), 1), max(round(height * scale), 1))
+            bgr = cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(ext, bgr, [quality_flag, int(quality)])
+        if not ok:
+            raise ValueError(f"图像编码失败: {frame.label}")
+        if scale < 1 or len(encoded) < len(original):
+            mime, data = encoded_mime, encoded.tobytes()
+    
+    payload = (mime, base64.b64encode(data).decode('utf-8'))
+    payload_stats.record(len(original), len(data), time.perf_counter() - t0)
+    frame.cache[cache_key] = payload
+    return payload
@@ -0,0 +1,155 @@
+"""
+LLM HTTP 客户端模块
+功能：进程内共享的 OpenAI 兼容客户端（httpx 连接池 + HTTP keep-alive + 超时），
+      LLMGenerator 与 baseline.py 复用同一组 TCP/TLS 连接；
+      通过 httpcore 的 trace 扩展统计新建连接与复用连接的请求数，估计复用节省的握手耗时
+"""
+
+import asyncio
+import threading
+import time
+
+import config
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_loop = None
+
+
+class ConnectionStats:
+    """新建连接（TCP 连接 + TLS 握手）与复用连接的请求统计"""
+    
+    HANDSHAKE_EVENTS = ("connection.connect_tcp", "connection.start_tls")
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.handshake_seconds = 0.0
+    
+    def on_request(self, request):
+        """httpx 请求钩子（同步客户端）：为请求挂上 trace 回调"""
+        trace = self._tracer()
+        request.extensions["trace"] = lambda name, info: trace(name)
+    
+    async def aon_request(self, request):
+        """httpx 请求钩子（异步客户端）"""
+        trace = self._tracer()
+        
+        async def atrace(name, info):
+            trace(name)
+        request.extensions["trace"] = atrace
+    
+    def stats(self):
+        """
+        返回连接统计
+        
+        复用连接的请求省去了一次握手，节省耗时按新建连接的平均握手耗时估计
+        """
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            handshake = self.handshake_seconds / self.new_connections if self.new_connections else 0.0
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused': reused,
+                'handshake_ms': handshake * 1000,
+                'saved_seconds': reused * handshake,
+            }
+    
+    def _tracer(self):
+        """单个请求的 trace 回调：记录握手各阶段耗时"""
+        with self._lock:
+            self.requests += 1
+        started = {}
+        
+        def trace(name):
+            stage, _, event = name.rpartition(".")
+            if stage not in self.HANDSHAKE_EVENTS:
+                return
+            if event == "started":
+                started[stage] = time.perf_counter()
+            elif event == "complete" and stage in started:
+                with self._lock:
+                    self.handshake_seconds += time.perf_counter() - started.pop(stage)
+                    if stage == "connection.connect_tcp":
+                        self.new_connections += 1
+        return trace
+
+
+connection_stats = ConnectionStats()
+
+
+def _limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=config.LLM_HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout():
+    import httpx
+    return httpx.Timeout(config.LLM_HTTP_TIMEOUT, connect=config.LLM_HTTP_CONNECT_TIMEOUT)
+
+
+def get_client():
+    """
+    进程内共享的同步 OpenAI 客户端（首次调用时创建）
+    
+    需要不同选项时用 get_client().with_options(...)，副本仍共用同一个连接池
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            import httpx
+            from openai import OpenAI
+            _client = OpenAI(
+                api_key=config.OPENAI_API_KEY,
+                base_url=config.OPENAI_API_BASE,
+                timeout=_timeout(),
+                http_client=httpx.Client(
+                    limits=_limits(),
+                    timeout=_timeout(),
+                    event_hooks={"request": [connection_stats.on_request]}
+                )
+            )
+            print(f"[LLM] HTTP 连接池: 最多 {config.LLM_HTTP_MAX_CONNECTIONS} 个连接, "
+                  f"keep-alive {config.LLM_HTTP_KEEPALIVE_EXPIRY:.0f} 秒")
+        return _client
+
+
+def get_async_client():
+    """
+    进程内共享的异步 OpenAI 客户端
+    
+    只能在 event_loop() 返回的后台事件循环中使用（连接与事件循环绑定）
+    """
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            import httpx
+            from openai import AsyncOpenAI
+            _async_client = AsyncOpenAI(
+                api_key=config.OPENAI_API_KEY,
+                base_url=config.OPENAI_API_BASE,
+                timeout=_timeout(),
+                http_client=httpx.AsyncClient(
+                    limits=_limits(),
+                    timeout=_timeout(),
+                    event_hooks={"request": [connection_stats.aon_request]}
+                )
+            )
+        return _async_client
+
+
+def event_loop():
+    """进程内共享的后台事件循环（常驻守护线程），异步请求都在其中执行，连接池得以跨批次复用"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return _loop
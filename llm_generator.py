@@ -6,15 +6,101 @@ LLM 候选生成模块
 
 import config
 import re
-import base64
+import asyncio
+import queue
+import time
+import llm_client
+from image_frame import as_frame
+from image_payload import prepare_payload
+from rate_control import AdaptiveConcurrency, APIStatusError
+from response_cache import ResponseCache
+from spatial_relations import describe_relations
+
+
+class CandidateLineParser:
+    """候选描述的增量解析：文本可分块到达，只解析已完整到达的行，凑满期望数量后不再接收"""
+    
+    def __init__(self, parse_line, expected_num):
+        """
+        Args:
+            parse_line: 单行解析函数，返回有效候选或 None
+            expected_num: 期望的候选数量
+        """
+        self._parse_line = parse_line
+        self.expected_num = expected_num
+        self.candidates = []
+        self._buffer = ""
+    
+    @property
+    def done(self):
+        """是否已凑满期望数量"""
+        return len(self.candidates) >= self.expected_num
+    
+    def feed(self, text):
+        """加入新到达的文本，返回其中新解析出的有效候选"""
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        return self._accept(lines)
+    
+    def discard_partial(self):
+        """丢弃尚未完整到达的最后一行（流中途断开、重新请求时）"""
+        self._buffer = ""
+    
+    def finish(self):
+        """输出结束：解析最后一行（没有换行结尾），返回新解析出的有效候选"""
+        lines, self._buffer = [self._buffer], ""
+        return self._accept(lines)
+    
+    def _accept(self, lines):
+        accepted = []
+        for line in lines:
+            if self.done:
+                break
+            candidate = self._parse_line(line)
+            if candidate is not None:
+                self.candidates.append(candidate)
+                accepted.append(candidate)
+        return accepted
+
+
+def _delta_text(chunk):
+    """流式响应块中的新增文本（usage 等无内容的块返回空串）"""
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
 
 
 class LLMGenerator:
     """LLM候选描述生成器（支持本地模型和API调用）"""
     
-    def __init__(self):
-        """初始化LLM生成器"""
+    def __init__(
+        self,
+        stream=config.LLM_STREAM,
+        use_cache=config.LLM_CACHE_ENABLED,
+        cache_epoch=config.LLM_CACHE_EPOCH,
+        cache_refresh=False
+    ):
+        """
+        初始化LLM生成器
+        
+        Args:
+            stream: 是否流式生成（仅 OpenAI 兼容 API 支持，其余模式忽略）
+            use_cache: 是否启用响应缓存
+            cache_epoch: 缓存轮次，修改后旧响应不再命中（相当于重新采样）
+            cache_refresh: 不读取缓存，只写入新响应
+        """
         self.use_api = config.LLM_USE_API
+        # API 调用的自适应并发控制与重试（本地模型不需要）
+        self.controller = AdaptiveConcurrency() if self.use_api else None
+        
+        self.stream = stream and self.use_api and config.LLM_API_TYPE == "openai"
+        if stream and not self.stream:
+            print("[LLM] 警告: 流式生成仅支持 OpenAI 兼容 API，已关闭")
+        # 流式生成统计
+        self.stream_stats = {'streams': 0, 'early_stops': 0, 'first_candidate_seconds': 0.0}
+        
+        # 原始响应磁盘缓存
+        self.response_cache = ResponseCache(epoch=cache_epoch, refresh=cache_refresh) if use_cache else None
         
         if self.use_api:
             self._init_api()
@@ -38,12 +124,9 @@ class LLMGenerator:
             
         elif config.LLM_API_TYPE == "openai":
             try:
-                from openai import OpenAI
-                # 使用新版 OpenAI SDK
-                self.openai_client = OpenAI(
-                    api_key=config.OPENAI_API_KEY,
-                    base_url=config.OPENAI_API_BASE
-                )
+                # 使用新版 OpenAI SDK，与 baseline.py 共享连接池
+                # 重试由 AdaptiveConcurrency 负责，关闭 SDK 自带的重试
+                self.openai_client = llm_client.get_client().with_options(max_retries=0)
                 print(f"[LLM] OpenAI 兼容 API 已配置")
                 print(f"[LLM] API Base: {config.OPENAI_API_BASE}")
                 print(f"[LLM] 模型: {config.OPENAI_MODEL}")
@@ -88,52 +171,304 @@ class LLMGenerator:
         except ImportError:
             raise ImportError("请安装 transformers 和 torch: pip install transformers torch")
     
-    def encode_image(self, image_path):
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    def encode_image(self, image):
+        """将图像（路径或 ImageFrame）缩放、重新编码后转为 base64（按图像缓存）"""
+        return prepare_payload(image)[1]
     
-    def generate_candidates(self, yolo_results, image_path, num_candidates=config.NUM_CANDIDATES):
+    def generate_candidates(self, yolo_results, image, num_candidates=config.NUM_CANDIDATES):
         """
         生成候选描述
         
         Args:
             yolo_results: YOLO检测结果字典
+            image: 图像路径或 ImageFrame
             num_candidates: 候选描述数量
             
         Returns:
             list: 候选描述列表
         """
         print(f"[LLM] 正在生成 {num_candidates} 个候选描述...")
+        # 重试时复用同一帧上缓存的上传负载
+        image = as_frame(image)
         
         # 构建提示词
         prompt = self._build_prompt(yolo_results, num_candidates)
         
         print(f"[LLM] 提示词已构建")
         
-        # 根据模式调用不同的生成方法
-        if self.use_api:
-            response = self._generate_api(prompt, image_path)
-        else:
-            response = self._generate_local(prompt)
+        key = self._cache_key(prompt, image)
+        response = self._cached_response(key)
+        if response is None:
+            # 根据模式调用不同的生成方法
+            t0 = time.time()
+            if self.use_api:
+                response = self.controller.call(self._generate_api, prompt, image)
+            else:
+                response = self._generate_local(prompt)
+            self._cache_response(key, response, time.time() - t0)
+        
+        return self._finish_candidates(response, num_candidates)
+    
+    def stream_candidates(self, yolo_results, image, num_candidates=config.NUM_CANDIDATES):
+        """
+        流式生成候选描述：边接收边按行解析，每得到一个有效候选立即返回；
+        凑满 num_candidates 个后关闭连接，不再等待剩余的 token
+        
+        未启用流式时生成完毕后逐个返回
+        
+        Args:
+            yolo_results: YOLO检测结果字典
+            image: 图像路径或 ImageFrame
+            num_candidates: 候选描述数量
+        
+        Yields:
+            str: 有效候选描述（按生成顺序）
+        """
+        if not self.stream:
+            yield from self.generate_candidates(yolo_results, image, num_candidates)
+            return
+        
+        print(f"[LLM] 正在流式生成 {num_candidates} 个候选描述...")
+        image = as_frame(image)
+        prompt = self._build_prompt(yolo_results, num_candidates)
+        key = self._cache_key(prompt, image)
+        cached = self._cached_response(key)
+        if cached is not None:
+            yield from self._finish_candidates(cached, num_candidates)
+            return
+        
+        t0 = time.time()
+        kwargs = self._completion_kwargs(self._build_messages(prompt, image), stream=True)
+        parser = CandidateLineParser(self._parse_line, num_candidates)
+        received = []
+        first_candidate = None
+        stopped_early = False
+        
+        def consume(stream):
+            nonlocal first_candidate, stopped_early
+            # 流中途断开后重试：已返回的候选保留，丢弃上次未完整到达的行，新响应只补足剩余数量
+            text = "".join(received)
+            received[:] = [text[:text.rfind("\n") + 1]]
+            parser.discard_partial()
+            for chunk in stream:
+                received.append(_delta_text(chunk))
+                for candidate in parser.feed(received[-1]):
+                    if first_candidate is None:
+                        first_candidate = time.time() - t0
+                    yield candidate
+                if parser.done:
+                    stopped_early = True
+                    return
+            yield from parser.finish()
+        
+        # 并发名额一直持有到流读完或关闭，中途失败同样退避重试
+        yield from self.controller.call_stream(
+            lambda: self.openai_client.chat.completions.create(**kwargs), consume
+        )
+        # 提前停止时缓存已接收的部分（已包含足够的候选）
+        self._cache_response(key, "".join(received), time.time() - t0)
+        self._record_stream(stopped_early, first_candidate)
+        self._log_candidates(parser.candidates, num_candidates)
+    
+    def iter_candidates(self, jobs, concurrency=config.LLM_CONCURRENCY):
+        """
+        并发生成多张图像的候选描述，按完成顺序逐个返回
+        
+        请求在进程共享的后台事件循环中执行，最多 concurrency 个同时在途；
+        调用方在其余请求仍在等待时即可处理已返回的结果
+        
+        Args:
+            jobs: [(yolo_results, image, num_candidates), ...]
+            concurrency: 同时在途的最大请求数
+        
+        Yields:
+            (index, candidates, elapsed): jobs 中的下标、候选描述列表与该请求耗时（秒）；
+                                          请求失败（重试耗尽）时 candidates 为异常对象，其余请求照常进行
+        """
+        if not jobs:
+            return
+        if self.controller is not None:
+            self.controller.set_max_limit(concurrency)
+        results = queue.Queue()
+        task = asyncio.run_coroutine_threadsafe(
+            self._run_jobs(jobs, concurrency, results), llm_client.event_loop()
+        )
+        try:
+            for _ in range(len(jobs)):
+                index, candidates, elapsed = results.get()
+                if index is None:
+                    # 事件循环中的任务整体失败（如创建客户端出错），不会再有结果
+                    raise candidates
+                yield index, candidates, elapsed
+        finally:
+            # 提前退出（调用方中断）时取消剩余请求
+            task.cancel()
+    
+    async def agenerate_candidates(self, yolo_results, image, num_candidates=config.NUM_CANDIDATES, client=None):
+        """
+        generate_candidates 的异步版本
+        
+        OpenAI 兼容 API 传入 client (AsyncOpenAI) 时直接异步请求，
+        其余模式在线程池中调用同步实现
+        """
+        if client is None:
+            return await asyncio.to_thread(self.generate_candidates, yolo_results, image, num_candidates)
+        
+        print(f"[LLM] 正在生成 {num_candidates} 个候选描述...")
+        image = as_frame(image)
+        prompt = self._build_prompt(yolo_results, num_candidates)
+        # 读图、哈希与 base64 编码放到线程池，不阻塞事件循环
+        key = await asyncio.to_thread(self._cache_key, prompt, image)
+        cached = self._cached_response(key)
+        if cached is not None:
+            return self._finish_candidates(cached, num_candidates)
+        
+        messages = await asyncio.to_thread(self._build_messages, prompt, image)
+        kwargs = self._completion_kwargs(messages, stream=self.stream)
+        t0 = time.time()
+        if not self.stream:
+            response = await self.controller.acall(lambda: client.chat.completions.create(**kwargs))
+            content = response.choices[0].message.content
+            self._cache_response(key, content, time.time() - t0)
+            return self._finish_candidates(content, num_candidates)
+        
+        # 流式：整个流在同一次尝试中读完，并发名额与延迟计时覆盖实际生成过程，中途失败整体重试
+        parser, received, stopped_early, first_candidate = await self.controller.acall(
+            lambda: self._aread_stream(client, kwargs, num_candidates, t0)
+        )
+        self._cache_response(key, "".join(received), time.time() - t0)
+        self._record_stream(stopped_early, first_candidate)
+        self._log_candidates(parser.candidates, num_candidates)
+        return parser.candidates
+    
+    async def _aread_stream(self, client, kwargs, num_candidates, t0):
+        """
+        发起流式请求并读取到凑满候选数（随后提前关闭连接）或输出结束
+        
+        Returns:
+            (parser, received, stopped_early, first_candidate)
+        """
+        parser = CandidateLineParser(self._parse_line, num_candidates)
+        received = []
+        first_candidate = None
+        stopped_early = False
+        response = await client.chat.completions.create(**kwargs)
+        async with response:
+            async for chunk in response:
+                received.append(_delta_text(chunk))
+                if parser.feed(received[-1]) and first_candidate is None:
+                    first_candidate = time.time() - t0
+                if parser.done:
+                    stopped_early = True
+                    break
+            else:
+                parser.finish()
+        return parser, received, stopped_early, first_candidate
+    
+    async def _run_jobs(self, jobs, concurrency, results):
+        """
+        在事件循环中执行全部请求，每完成一个就放入 results 队列
         
+        单个请求失败时放入 (下标, 异常, 耗时)；整体失败时放入 (None, 异常, 0.0)，避免调用方一直等待
+        """
+        try:
+            if not self.use_api:
+                # 本地模型不支持并发推理
+                concurrency = 1
+            semaphore = asyncio.Semaphore(max(concurrency, 1))
+            client = self._async_client()
+            
+            async def run(index, job):
+                async with semaphore:
+                    t0 = time.time()
+                    try:
+                        candidates = await self.agenerate_candidates(*job, client=client)
+                    except Exception as e:
+                        candidates = e
+                    results.put((index, candidates, time.time() - t0))
+            
+            await asyncio.gather(*(run(index, job) for index, job in enumerate(jobs)))
+        except Exception as e:
+            results.put((None, e, 0.0))
+    
+    def _async_client(self):
+        """OpenAI 兼容 API 返回共享的 AsyncOpenAI 客户端（关闭 SDK 自带的重试），其余模式返回 None"""
+        if not (self.use_api and config.LLM_API_TYPE == "openai"):
+            return None
+        return llm_client.get_async_client().with_options(max_retries=0)
+    
+    def _finish_candidates(self, response, num_candidates):
+        """打印原始输出并解析候选描述"""
         print(f"[LLM] 原始输出:\n{response[:200]}...")
         print("-" * 50)
         
         # 解析候选描述
         candidates = self._parse_response(response, num_candidates)
+        self._log_candidates(candidates, num_candidates)
+        return candidates
+    
+    def _cache_key(self, prompt, image):
+        """
+        响应缓存键：API 地址 + 模型 + 提示词 + 图像内容哈希（仅上传图像的模式）+ 采样参数；未启用缓存时返回 None
+        """
+        if self.response_cache is None:
+            return None
+        params = {
+            "temperature": config.LLM_TEMPERATURE,
+            "top_p": config.LLM_TOP_P,
+            "max_tokens": config.LLM_MAX_LENGTH,
+        }
+        if not self.use_api:
+            model, image_hash = config.LLM_MODEL_NAME, ""
+            params["top_k"] = config.LLM_TOP_K
+        elif config.LLM_API_TYPE == "dashscope":
+            model, image_hash = config.DASHSCOPE_MODEL, ""
+            params["api"] = "dashscope"
+        else:
+            model, image_hash = config.OPENAI_MODEL, as_frame(image).sha256
+            # 同名模型在不同服务（如本地测试桩）上的响应互不复用
+            params["api"] = config.OPENAI_API_BASE
+            # 上传负载的缩放与编码参数也会影响模型看到的图像
+            params["image"] = [config.LLM_IMAGE_MAX_SIDE, config.LLM_IMAGE_FORMAT, config.LLM_IMAGE_QUALITY]
+        return self.response_cache.make_key(model, prompt, image_hash, params)
+    
+    def _cached_response(self, key):
+        """查询响应缓存，未命中时返回 None"""
+        if key is None:
+            return None
+        response = self.response_cache.get(key)
+        if response is not None:
+            print(f"[LLM] 命中响应缓存，跳过 API 调用")
+        return response
+    
+    def _cache_response(self, key, response, latency):
+        """写入响应缓存（空响应不缓存）"""
+        if key is not None and response:
+            self.response_cache.put(key, response, latency)
+    
+    def _record_stream(self, stopped_early, first_candidate):
+        """记录一次流式生成（是否提前停止、首个候选的到达时间）"""
+        self.stream_stats['streams'] += 1
+        if stopped_early:
+            self.stream_stats['early_stops'] += 1
+        if first_candidate is not None:
+            self.stream_stats['first_candidate_seconds'] += first_candidate
+    
+    def _log_candidates(self, candidates, num_candidates):
+        """打印解析出的候选描述"""
+        if len(candidates) < num_candidates:
+            print(f"[LLM] 警告: 只生成了 {len(candidates)}/{num_candidates} 个有效候选")
         
         print(f"[LLM] 成功生成 {len(candidates)} 个候选")
         for i, cand in enumerate(candidates, 1):
             print(f"       {i}. {cand}")
-        
-        return candidates
     
-    def _generate_api(self, prompt, image_path):
+    def _generate_api(self, prompt, image):
         """使用API生成文本"""
         if config.LLM_API_TYPE == "dashscope":
             return self._generate_dashscope(prompt)
         elif config.LLM_API_TYPE == "openai":
-            return self._generate_openai(prompt, image_path)
+            return self._generate_openai(prompt, image)
         else:
             raise ValueError(f"不支持的API类型: {config.LLM_API_TYPE}")
     
@@ -152,12 +487,33 @@ class LLMGenerator:
         if response.status_code == 200:
             return response.output.text
         else:
-            raise Exception(f"API调用失败: {response.message}")
+            raise APIStatusError(response.status_code, f"API调用失败: {response.message}")
     
-    def _generate_openai(self, prompt, image_path):
+    def _generate_openai(self, prompt, image):
         """使用OpenAI兼容API生成（新版SDK）"""
-        img_type = f"image/{image_path.split('.')[-1]}"
-        img_b64_str = self.encode_image(image_path)
+        completion = self.openai_client.chat.completions.create(
+            **self._completion_kwargs(self._build_messages(prompt, image))
+        )
+        
+        return completion.choices[0].message.content
+    
+    def _completion_kwargs(self, messages, stream=False):
+        """chat.completions.create 的请求参数"""
+        kwargs = {
+            "model": config.OPENAI_MODEL,
+            "messages": messages,
+            "max_tokens": config.LLM_MAX_LENGTH,
+            "temperature": config.LLM_TEMPERATURE,
+            "top_p": config.LLM_TOP_P,
+        }
+        if stream:
+            kwargs["stream"] = True
+        return kwargs
+    
+    def _build_messages(self, prompt, image):
+        """构建包含图像与提示词的 OpenAI 消息"""
+        # 缩放、重新编码后的负载（MIME 类型按实际编码格式或文件头确定）
+        img_type, img_b64_str = prepare_payload(image)
         messages = [
             {
                 "role": "user",
@@ -175,15 +531,7 @@ class LLMGenerator:
                 ]
             }
         ]
-        completion = self.openai_client.chat.completions.create(
-            model=config.OPENAI_MODEL,
-            messages=messages,
-            max_tokens=config.LLM_MAX_LENGTH,
-            temperature=config.LLM_TEMPERATURE,
-            top_p=config.LLM_TOP_P,
-        )
-        
-        return completion.choices[0].message.content
+        return messages
     
     def _generate_local(self, prompt):
         """使用本地模型生成"""
@@ -209,11 +557,15 @@ class LLMGenerator:
         position_summary = {obj: ', '.join(pos) if pos else "未知" 
                            for obj, pos in positions.items()}
         
+        # 物体间空间关系
+        relations = describe_relations(yolo_results.get('detections'))
+        
         # 使用配置中的模板
         prompt = config.PROMPT_TEMPLATE.format(
             objects=', '.join(objects),
             counts=str(counts),
             positions=str(position_summary),
+            relations='；'.join(relations) if relations else "无",
             scene=scene,
             num_candidates=num_candidates,
             min_length=config.MIN_CAPTION_LENGTH,
@@ -233,32 +585,32 @@ class LLMGenerator:
         Returns:
             list: 候选描述列表
         """
-        lines = response.strip().split('\n')
+        parser = CandidateLineParser(self._parse_line, expected_num)
+        parser.feed(response.strip())
+        parser.finish()
+        return parser.candidates
+    
+    def _parse_line(self, line):
+        """
+        解析单行输出
         
-        candidates = []
-        for line in lines:
-            line = line.strip()
-            
-            if not line:
-                continue
-            
-            # 移除编号
-            line = re.sub(r'^\d+[.、\s]+', '', line)
-            
-            # 检查长度
-            print(f"[LLM] 处理描述: {line} (长度: {len(line)})")
-            if config.MIN_CAPTION_LENGTH <= len(line) <= config.MAX_CAPTION_LENGTH + 10:
-                candidates.append(line)
-            else: 
-                print(f"[LLM] 忽略不符合长度要求的描述: {line} (长度: {len(line)})")
-            
-            if len(candidates) >= expected_num:
-                break
+        Returns:
+            str: 去掉编号后的有效候选；空行或长度不符合要求时返回 None
+        """
+        line = line.strip()
         
-        if len(candidates) < expected_num:
-            print(f"[LLM] 警告: 只生成了 {len(candidates)}/{expected_num} 个有效候选")
+        if not line:
+            return None
         
-        return candidates
+        # 移除编号
+        line = re.sub(r'^\d+[.、\s]+', '', line)
+        
+        # 检查长度
+        print(f"[LLM] 处理描述: {line} (长度: {len(line)})")
+        if config.MIN_CAPTION_LENGTH <= len(line) <= config.MAX_CAPTION_LENGTH + 10:
+            return line
+        print(f"[LLM] 忽略不符合长度要求的描述: {line} (长度: {len(line)})")
+        return None
 
 
 # ============ 测试代码 ============
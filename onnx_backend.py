@@ -0,0 +1,164 @@
+"""
+YOLO ONNX Runtime 后端
+功能：将 YOLO 模型导出为 ONNX 并缓存，使用 ONNX Runtime（CPU）推理，
+      自带 letterbox 预处理与 NMS 后处理，输出与 PyTorch 后端相同的 Detections
+"""
+
+import ast
+import os
+import shutil
+
+import cv2
+import numpy as np
+import config
+from box_ops import batched_nms
+from detections import Detections
+
+
+def export_onnx(model_name=config.YOLO_MODEL, imgsz=config.YOLO_IMGSZ, export_dir=config.YOLO_ONNX_DIR):
+    """
+    导出 ONNX 模型（已存在则直接返回缓存路径）
+    
+    Args:
+        model_name: YOLO模型名称，如 'yolov8n.pt'
+        imgsz: 导出时的输入尺寸
+        export_dir: ONNX 文件缓存目录
+        
+    Returns:
+        str: ONNX 文件路径
+    """
+    stem = os.path.splitext(os.path.basename(model_name))[0]
+    onnx_path = os.path.join(export_dir, f"{stem}_{imgsz}.onnx")
+    if os.path.exists(onnx_path):
+        return onnx_path
+    
+    from ultralytics import YOLO
+    print(f"[YOLO] 正在导出 ONNX 模型: {model_name} -> {onnx_path}")
+    # dynamic=True：允许批量推理以及非正方形（最小填充）输入
+    exported = YOLO(model_name).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    os.makedirs(export_dir, exist_ok=True)
+    shutil.move(str(exported), onnx_path)
+    return onnx_path
+
+
+def letterbox(image, new_shape, auto=False, stride=32, color=(114, 114, 114)):
+    """
+    等比缩放并填充到 new_shape（与 ultralytics LetterBox 一致）
+    
+    Args:
+        image: BGR 图像
+        new_shape: 目标尺寸 (height, width)
+        auto: 为 True 时只填充到 stride 的整数倍（最小填充）
+        
+    Returns:
+        (padded, gain, (pad_left, pad_top))
+    """
+    h, w = image.shape[:2]
+    gain = min(new_shape[0] / h, new_shape[1] / w)
+    new_unpad = (round(w * gain), round(h * gain))
+    dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
+    if auto:
+        dw, dh = dw % stride, dh % stride
+    dw /= 2
+    dh /= 2
+    
+    if (w, h) != new_unpad:
+        image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = round(dh - 0.1), round(dh + 0.1)
+    left, right = round(dw - 0.1), round(dw + 0.1)
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, (new_unpad[0] / w, new_unpad[1] / h), (left, top)
+
+
+class ONNXYOLO:
+    """基于 ONNX Runtime 的 YOLO 推理器（CPU）"""
+    
+    def __init__(self, model_name=config.YOLO_MODEL, imgsz=config.YOLO_IMGSZ, quantize=False):
+        """
+        Args:
+            model_name: YOLO模型名称（首次使用时导出为 ONNX）
+            imgsz: 推理输入尺寸
+            quantize: 是否使用 int8 动态量化后的模型（首次使用时量化并缓存）
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("请安装 onnxruntime: pip install onnxruntime onnx")
+        
+        self.onnx_path = export_onnx(model_name, imgsz)
+        if quantize:
+            from quantization import quantize_onnx_int8
+            self.onnx_path = quantize_onnx_int8(self.onnx_path)
+        self.session = ort.InferenceSession(self.onnx_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"])
+        self.stride = int(metadata.get("stride", 32))
+        self.imgsz = imgsz
+    
+    def predict(
+        self,
+        frames,
+        conf=config.YOLO_CONF_THRESHOLD,
+        iou=config.YOLO_IOU_THRESHOLD,
+        max_det=300,
+        imgsz=None
+    ):
+        """
+        批量推理
+        
+        Args:
+            frames: ImageFrame 列表
+            conf: 置信度阈值
+            iou: NMS IoU 阈值
+            max_det: 每张图像最多保留的检测框数
+            imgsz: 输入尺寸（动态输入模型可与导出尺寸不同），默认使用 self.imgsz
+        
+        Returns:
+            list: 与 frames 一一对应的 Detections
+        """
+        images = [frame.bgr for frame in frames]
+        imgsz = imgsz or self.imgsz
+        
+        # 与 ultralytics 相同：同尺寸输入用最小填充，否则统一填充到 imgsz x imgsz
+        auto = len({image.shape for image in images}) == 1
+        batch, metas = [], []
+        for image in images:
+            padded, gain, pad = letterbox(image, (imgsz, imgsz), auto=auto, stride=self.stride)
+            batch.append(padded)
+            metas.append((image.shape[:2], gain, pad))
+        
+        # BGR HWC uint8 -> RGB NCHW float32 [0, 1]
+        blob = np.stack(batch)[..., ::-1].transpose(0, 3, 1, 2)
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+        
+        # [B, 4 + num_classes, num_anchors]
+        outputs = self.session.run(None, {self.input_name: blob})[0]
+        
+        detections = []
+        for frame, pred, (orig_shape, gain, pad) in zip(frames, outputs, metas):
+            data = self._postprocess(pred, conf, iou, max_det)
+            data[:, [0, 2]] = ((data[:, [0, 2]] - pad[0]) / gain[0]).clip(0, orig_shape[1])
+            data[:, [1, 3]] = ((data[:, [1, 3]] - pad[1]) / gain[1]).clip(0, orig_shape[0])
+            detections.append(Detections.from_array(data, orig_shape, self.names, frame.path))
+        return detections
+    
+    @staticmethod
+    def _postprocess(pred, conf, iou, max_det):
+        """解码单张图像的原始输出并做类别内 NMS，返回 [N, 6] (xyxy, conf, cls)"""
+        pred = pred.T  # [num_anchors, 4 + num_classes]
+        class_scores = pred[:, 4:]
+        cls = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(cls)), cls]
+        
+        mask = scores > conf
+        boxes, scores, cls = pred[mask, :4], scores[mask], cls[mask]
+        
+        # cx, cy, w, h -> x1, y1, x2, y2
+        xyxy = np.empty_like(boxes)
+        xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+        xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+        
+        keep = batched_nms(xyxy, scores, cls, iou)[:max_det]
+        return np.column_stack([xyxy[keep], scores[keep], cls[keep]]).astype(np.float32)
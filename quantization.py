@@ -0,0 +1,82 @@
+"""
+Int8 动态量化模块
+功能：CPU 节点上对 YOLO（ONNX 模型）与 CLIP（PyTorch 模型）做 int8 动态量化，
+      并将量化后的模型缓存到 QUANTIZED_MODEL_DIR，避免每次启动重复量化
+"""
+
+import os
+
+import config
+
+
+def quantize_onnx_int8(onnx_path, output_dir=config.QUANTIZED_MODEL_DIR):
+    """
+    对 ONNX 模型做 int8 动态量化（已存在则直接返回缓存路径）
+    
+    Args:
+        onnx_path: fp32 ONNX 文件路径
+        output_dir: 量化模型缓存目录
+    
+    Returns:
+        str: int8 ONNX 文件路径
+    """
+    stem = os.path.splitext(os.path.basename(onnx_path))[0]
+    int8_path = os.path.join(output_dir, f"{stem}_int8.onnx")
+    if os.path.exists(int8_path):
+        return int8_path
+    
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError:
+        raise ImportError("请安装 onnxruntime: pip install onnxruntime onnx")
+    
+    print(f"[量化] 正在量化 ONNX 模型: {onnx_path} -> {int8_path}")
+    os.makedirs(output_dir, exist_ok=True)
+    # 卷积量化为 ConvInteger，CPU 上要求 uint8 权重
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+def quantize_torch_int8(model):
+    """对模型中的 nn.Linear 做 int8 动态量化（仅 CPU），返回新模型"""
+    import torch
+    
+    return torch.ao.quantization.quantize_dynamic(
+        model.cpu(), {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def load_quantized_torch(model, name, output_dir=config.QUANTIZED_MODEL_DIR):
+    """
+    获取 fp32 模型的 int8 动态量化版本，整个量化后的模块缓存到磁盘
+    
+    缓存存在时直接载入量化模块，跳过 quantize_dynamic；
+    缓存无法载入（如 torch 版本变化或旧版只含 state_dict 的缓存）时重新量化并覆盖
+    
+    Args:
+        model: fp32 模型（CPU）
+        name: 缓存文件名（不含扩展名），如 'clip_ViT-B-16'
+        output_dir: 量化模型缓存目录
+    
+    Returns:
+        torch.nn.Module: 量化后的模型（eval 模式）
+    """
+    import torch
+    
+    cache_path = os.path.join(output_dir, f"{name}_int8.pt")
+    if os.path.exists(cache_path):
+        try:
+            # 缓存为完整模块（pickle），需关闭 weights_only
+            quantized = torch.load(cache_path, map_location="cpu", weights_only=False)
+        except Exception as e:
+            print(f"[量化] 缓存无法载入，重新量化: {e}")
+        else:
+            if isinstance(quantized, torch.nn.Module):
+                return quantized.eval()
+            print(f"[量化] 缓存格式已过期，重新量化: {cache_path}")
+    
+    quantized = quantize_torch_int8(model)
+    print(f"[量化] 缓存量化模型: {cache_path}")
+    os.makedirs(output_dir, exist_ok=True)
+    torch.save(quantized, cache_path)
+    return quantized.eval()
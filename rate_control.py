@@ -0,0 +1,300 @@
+"""
+LLM 请求限流模块
+功能：按 AIMD 方式自适应调整在途请求数（429 或延迟 p95 超标时乘性减小，请求顺利时每轮加一），
+      失败请求按带抖动的指数退避重试；同步（线程）与异步（asyncio）调用共用同一个并发上限
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+
+import config
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRYABLE_ERRORS = ("APIConnectionError", "APITimeoutError")  # openai SDK 的网络错误类型名
+
+
+class APIStatusError(Exception):
+    """带 HTTP 状态码的 API 调用失败（如 DashScope 返回非 200）"""
+    
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def status_code(error):
+    """异常对应的 HTTP 状态码，没有时返回 None"""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+def is_throttled(error):
+    """是否为限流错误 (429)"""
+    return status_code(error) == 429
+
+
+def is_retryable(error):
+    """限流、服务端错误与网络错误可以重试，其余错误（如 400 / 401）直接抛出"""
+    if status_code(error) in RETRYABLE_STATUS:
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in _RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def retry_after(error):
+    """服务端通过 Retry-After 头给出的等待秒数，没有时返回 None"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdaptiveConcurrency:
+    """AIMD 并发控制器 + 退避重试"""
+    
+    def __init__(
+        self,
+        max_limit=config.LLM_CONCURRENCY,
+        initial=config.LLM_AIMD_INITIAL,
+        min_limit=config.LLM_AIMD_MIN,
+        decrease=config.LLM_AIMD_DECREASE,
+        target_p95=config.LLM_TARGET_P95,
+        window=config.LLM_LATENCY_WINDOW,
+        max_retries=config.LLM_MAX_RETRIES,
+        backoff_base=config.LLM_BACKOFF_BASE,
+        backoff_max=config.LLM_BACKOFF_MAX
+    ):
+        """
+        Args:
+            max_limit: 并发上限的最大值
+            initial: 初始并发上限
+            min_limit: 并发上限的最小值
+            decrease: 乘性减小系数
+            target_p95: 最近请求延迟 p95 超过该值（秒）时视为过载
+            window: 计算 p95 的滑动窗口大小（请求数）
+            max_retries: 单个请求的最大重试次数
+            backoff_base: 第 n 次重试前等待 [0, backoff_base * 2^n] 秒内的随机时长
+            backoff_max: 单次等待上限（秒）
+        """
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = max(min(min_limit, self.max_limit), 1)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.decrease = decrease
+        self.target_p95 = target_p95
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._async_waiters = deque()  # 等待名额的协程: (事件循环, future)
+        self._latencies = deque(maxlen=max(window, 1))
+        self._since_increase = 0
+        self._since_decrease = self.limit  # 上次减小后完成的请求数（每轮最多减小一次）
+        
+        self.in_flight = 0
+        self.requests = 0     # 实际发出的请求数（含重试）
+        self.retries = 0
+        self.throttled = 0    # 收到 429 的次数
+        self.failures = 0     # 重试耗尽或不可重试的请求数
+        self.decreases = 0
+        self.peak_limit = self.limit
+    
+    def set_max_limit(self, max_limit):
+        """调整并发上限的最大值（如命令行指定的并发数）"""
+        with self._lock:
+            self.max_limit = max(max_limit, 1)
+            self.min_limit = min(self.min_limit, self.max_limit)
+            self.limit = min(self.limit, self.max_limit)
+    
+    def call(self, fn, *args, **kwargs):
+        """同步调用 fn(*args, **kwargs)，受并发上限约束，失败时退避重试"""
+        attempt = 0
+        while True:
+            self._acquire()
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                self._on_success(time.perf_counter() - t0)
+                return result
+            finally:
+                self._release()
+            time.sleep(delay)
+            attempt += 1
+    
+    async def acall(self, make_coro):
+        """
+        异步版本：每次尝试调用 make_coro() 创建新的协程并等待
+        
+        流式请求应在协程内读完整个流，名额与计时才覆盖实际生成过程，中途失败也会重试
+        """
+        attempt = 0
+        while True:
+            await self._aacquire()
+            t0 = time.perf_counter()
+            try:
+                result = await make_coro()
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                self._on_success(time.perf_counter() - t0)
+                return result
+            finally:
+                self._release()
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    def call_stream(self, open_stream, consume):
+        """
+        同步流式调用：名额与延迟计时覆盖整个流（直到读完或关闭），而不只是等待响应头
+        
+        Args:
+            open_stream: 无参函数，发起请求并返回流式响应（支持 with）
+            consume: 生成器函数 consume(stream)，逐个产出结果；重试时以新的流再次调用
+        
+        Yields:
+            consume 产出的结果；建立连接或读取中途失败时按 call() 的规则退避重试
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            t0 = time.perf_counter()
+            try:
+                with open_stream() as stream:
+                    yield from consume(stream)
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                self._on_success(time.perf_counter() - t0)
+                return
+            finally:
+                self._release()
+            time.sleep(delay)
+            attempt += 1
+    
+    def stats(self):
+        """返回当前并发上限与限流统计"""
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'peak_limit': self.peak_limit,
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'failures': self.failures,
+                'decreases': self.decreases,
+                'p95_latency': self._p95(),
+            }
+    
+    def _acquire(self):
+        with self._released:
+            while self.in_flight >= self.limit:
+                self._released.wait()
+            self.in_flight += 1
+            self.requests += 1
+    
+    async def _aacquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    self.requests += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+    
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+    
+    def _wake(self):
+        """唤醒所有等待者重新检查名额（调用方持有锁）"""
+        self._released.notify_all()
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+    
+    def _on_success(self, latency):
+        with self._lock:
+            self._since_decrease += 1
+            self._latencies.append(latency)
+            if len(self._latencies) * 2 >= self._latencies.maxlen and self._p95() > self.target_p95:
+                self._decrease()
+                return
+            # 加性增加：每完成 limit 个顺利的请求（约一轮往返）上限加一
+            self._since_increase += 1
+            if self._since_increase >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self.peak_limit = max(self.peak_limit, self.limit)
+                self._since_increase = 0
+                self._wake()
+    
+    def _on_error(self, error, attempt):
+        """
+        记录失败并决定是否重试
+        
+        Returns:
+            重试前的等待秒数；不再重试时返回 None
+        """
+        with self._lock:
+            self._since_decrease += 1
+            if is_throttled(error):
+                self.throttled += 1
+                self._decrease()
+            if attempt >= self.max_retries or not is_retryable(error):
+                self.failures += 1
+                return None
+            self.retries += 1
+        delay = retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, self.backoff_base * 2 ** attempt)
+        print(f"[LLM] 请求失败 ({type(error).__name__}: {error})，{delay:.1f} 秒后第 {attempt + 1} 次重试")
+        return min(delay, self.backoff_max)
+    
+    def _decrease(self):
+        """乘性减小（调用方持有锁）；同一轮中的多次过载信号只减小一次"""
+        if self._since_decrease < self.limit:
+            return
+        self.limit = max(self.min_limit, int(self.limit * self.decrease))
+        self.decreases += 1
+        self._since_decrease = 0
+        self._since_increase = 0
+        self._latencies.clear()
+        print(f"[LLM] 检测到过载，并发上限降为 {self.limit}")
+    
+    def _p95(self):
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[math.ceil(0.95 * len(ordered)) - 1]
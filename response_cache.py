@@ -0,0 +1,149 @@
+"""
+LLM 响应缓存模块
+功能：将 LLM 原始输出持久化到 SQLite，键为 模型 + 渲染后的提示词 + 图像内容哈希 + 采样参数 + 缓存轮次 的哈希；
+      重复运行同一批图像时跳过 API 调用；条目按 TTL 过期，总大小超出上限时按最久未使用淘汰
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import config
+
+
+class ResponseCache:
+    """LLM 响应的 SQLite 磁盘缓存（线程安全，异步批量生成与同步调用共用）"""
+    
+    def __init__(
+        self,
+        path=config.LLM_CACHE_PATH,
+        max_mb=config.LLM_CACHE_MAX_MB,
+        ttl_days=config.LLM_CACHE_TTL_DAYS,
+        epoch=config.LLM_CACHE_EPOCH,
+        refresh=False
+    ):
+        """
+        打开（或新建）缓存
+        
+        Args:
+            path: SQLite 数据库路径
+            max_mb: 响应总大小上限（MB）
+            ttl_days: 条目有效期（天），0 表示不过期
+            epoch: 缓存轮次（参与缓存键计算），修改后旧响应不再命中
+            refresh: 为 True 时不读取缓存，只写入新响应（覆盖旧条目）
+        """
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl_days * 86400
+        self.epoch = epoch
+        self.refresh = refresh
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0  # 命中条目原本的生成耗时之和
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL,"
+            " latency REAL NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._expire()
+        
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        mode = "，本次只写入" if refresh else ""
+        print(f"[LLM] 响应缓存: {path} ({count} 条, 轮次 {epoch}{mode})")
+    
+    def make_key(self, model, prompt, image_hash, params):
+        """
+        缓存键
+        
+        Args:
+            model: 模型名称
+            prompt: 渲染后的提示词
+            image_hash: 图像内容哈希（不上传图像的模式为空串）
+            params: 采样参数字典（temperature / top_p / max_tokens 等）
+        """
+        settings = json.dumps(
+            [model, prompt, image_hash, params, self.epoch],
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+    
+    def get(self, key):
+        """查询缓存，返回原始响应文本；未命中、已过期或处于 refresh 模式时返回 None"""
+        if self.refresh:
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, latency, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl and row[2] < now - self.ttl):
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self.saved_seconds += row[1]
+        return row[0]
+    
+    def put(self, key, response, latency):
+        """
+        写入一条响应
+        
+        Args:
+            key: make_key() 的返回值
+            response: 原始响应文本
+            latency: 生成耗时（秒），命中时计入节省的耗时
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), latency, now, now)
+            )
+            self._evict()
+    
+    def stats(self):
+        """返回命中统计"""
+        total = self.hits + self.misses
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'saved_seconds': self.saved_seconds,
+            'evictions': self.evictions,
+            'entries': count,
+            'size_mb': size / (1024 * 1024),
+        }
+    
+    def _expire(self):
+        """删除过期条目"""
+        if self.ttl:
+            with self._lock:
+                cursor = self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+                self.evictions += cursor.rowcount
+    
+    def _evict(self):
+        """总大小超出上限时按最久未使用淘汰（调用方持有锁）"""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.evictions += len(stale)
@@ -0,0 +1,214 @@
+"""
+空间关系分析模块
+功能：基于边界框计算物体之间的两两 IoU、中心距离与相对方位（NumPy 广播），
+      生成供 LLM 提示词使用的空间关系描述；检测框较多时使用网格索引只比较相邻物体
+"""
+
+import numpy as np
+import config
+from box_ops import box_area
+
+# 关系类型
+RELATION_CONTAIN = 0   # A 基本位于 B 范围内（如 杯子在餐桌上）
+RELATION_OVERLAP = 1   # A 与 B 明显重叠
+RELATION_NEAR = 2      # A 靠近 B（按中心相对方位描述）
+
+# 方位：A 相对于 B
+DIRECTION_NAMES = ("左侧", "右侧", "上方", "下方")
+
+
+def pairwise_geometry(xyxy):
+    """
+    计算全部两两几何关系
+    
+    Args:
+        xyxy: [N, 4] 边界框
+        
+    Returns:
+        dict: {
+            'iou': [N, N] IoU,
+            'contain': [N, N] i 落在 j 内的面积比例 (交集 / i 的面积),
+            'distance': [N, N] 中心距离（像素）,
+            'direction': [N, N] i 相对 j 的方位下标（见 DIRECTION_NAMES）
+        }
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float32)
+    return _pair_geometry(xyxy, *np.indices((len(xyxy), len(xyxy))))
+
+
+def _pair_geometry(xyxy, i, j):
+    """对下标数组 i, j 指定的框对（任意形状）计算几何量"""
+    a, b = xyxy[i], xyxy[j]
+    
+    lt = np.maximum(a[..., :2], b[..., :2])
+    rb = np.minimum(a[..., 2:], b[..., 2:])
+    wh = (rb - lt).clip(0)
+    inter = wh[..., 0] * wh[..., 1]
+    area = box_area(xyxy)
+    area_a, area_b = area[i], area[j]
+    union = area_a + area_b - inter
+    
+    delta = (a[..., :2] + a[..., 2:]) / 2 - (b[..., :2] + b[..., 2:]) / 2
+    dx, dy = delta[..., 0], delta[..., 1]
+    # 水平方向占优时为左/右，否则为上/下（图像 y 轴向下）
+    direction = np.where(
+        np.abs(dx) >= np.abs(dy),
+        np.where(dx < 0, 0, 1),
+        np.where(dy < 0, 2, 3)
+    )
+    
+    return {
+        'iou': np.divide(inter, union, out=np.zeros_like(inter), where=union > 0),
+        'contain': np.divide(inter, area_a, out=np.zeros_like(inter), where=area_a > 0),
+        'distance': np.hypot(dx, dy),
+        'direction': direction,
+    }
+
+
+def _candidate_pairs_grid(xyxy, reach):
+    """
+    网格索引：把每个框（各自向外扩展 reach）登记到覆盖的网格单元，
+    只有共享单元的框对才可能相交或"靠近"，其余框对无需比较
+    
+    Args:
+        xyxy: [N, 4] 边界框
+        reach: [N] 各框的扩展半径
+        
+    Returns:
+        (i, j): i < j 的候选框对下标，按 (i, j) 字典序排列
+    """
+    n = len(xyxy)
+    expanded = np.concatenate([xyxy[:, :2] - reach[:, None], xyxy[:, 2:] + reach[:, None]], axis=1)
+    # 单元边长取扩展后框的典型尺寸，使每个框只覆盖少量单元
+    cell = max(float(np.median((expanded[:, 2:] - expanded[:, :2]).max(axis=1))), 1.0)
+    lo = np.floor(expanded[:, :2] / cell).astype(np.int64)
+    hi = np.floor(expanded[:, 2:] / cell).astype(np.int64)
+    spans = hi - lo + 1
+    
+    # 展开为 (框, 单元) 登记表
+    counts = spans[:, 0] * spans[:, 1]
+    box_ids = np.repeat(np.arange(n), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cx = lo[box_ids, 0] + local % spans[box_ids, 0]
+    cy = lo[box_ids, 1] + local // spans[box_ids, 0]
+    cell_ids = (cx - cx.min()) * (cy.max() - cy.min() + 1) + (cy - cy.min())
+    
+    # 按单元分组（组内框下标升序）
+    order = np.lexsort((box_ids, cell_ids))
+    box_ids, cell_ids = box_ids[order], cell_ids[order]
+    groups = np.split(box_ids, np.flatnonzero(np.diff(cell_ids)) + 1)
+    
+    keys = []
+    for members in groups:
+        if len(members) < 2:
+            continue
+        ii, jj = np.triu_indices(len(members), k=1)
+        keys.append(members[ii] * n + members[jj])
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    
+    keys = np.unique(np.concatenate(keys))
+    return keys // n, keys % n
+
+
+def find_relations(xyxy, cls, orig_shape):
+    """
+    找出有意义的两两空间关系
+    
+    "靠近"的判定与物体自身尺寸相关：中心距离 < SPATIAL_NEAR_SCALE × 两框对角线长度的平均值
+    
+    Args:
+        xyxy: [N, 4] 边界框
+        cls: [N] 类别ID
+        orig_shape: 原图尺寸 (height, width)
+        
+    Returns:
+        dict: 各字段均为长度 M 的数组，按显著性降序
+            'subject', 'object': 主体 / 参照物体的下标
+            'relation': 关系类型 (RELATION_*)
+            'direction': 主体相对参照物体的方位（仅 RELATION_NEAR 有意义）
+            'score': 显著性（两框面积之和占画面比例）
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+    cls = np.asarray(cls).reshape(-1)
+    n = len(xyxy)
+    height, width = orig_shape
+    
+    # 各框的"靠近"半径：两框半径之和即为靠近阈值
+    reach = config.SPATIAL_NEAR_SCALE * np.hypot(
+        xyxy[:, 2] - xyxy[:, 0], xyxy[:, 3] - xyxy[:, 1]
+    ) / 2
+    
+    # 候选框对 (i < j)
+    if n > config.SPATIAL_GRID_MIN_BOXES:
+        i, j = _candidate_pairs_grid(xyxy, reach)
+    else:
+        i, j = np.triu_indices(n, k=1)
+    
+    # 同类物体之间不描述（如 人-人）
+    mask = cls[i] != cls[j]
+    i, j = i[mask], j[mask]
+    
+    # 以面积较小的框为主体："小物体 在 大物体 ..."
+    area = box_area(xyxy)
+    swap = area[i] > area[j]
+    subject = np.where(swap, j, i)
+    obj = np.where(swap, i, j)
+    
+    geometry = _pair_geometry(xyxy, subject, obj)
+    relation = np.full(len(subject), -1, dtype=np.int64)
+    relation[geometry['distance'] < reach[subject] + reach[obj]] = RELATION_NEAR
+    relation[geometry['iou'] > config.SPATIAL_OVERLAP_IOU] = RELATION_OVERLAP
+    relation[geometry['contain'] > config.SPATIAL_CONTAIN_RATIO] = RELATION_CONTAIN
+    
+    keep = relation >= 0
+    score = (area[subject] + area[obj]) / float(width * height)
+    order = np.argsort(-score[keep], kind='stable')
+    
+    return {
+        'subject': subject[keep][order],
+        'object': obj[keep][order],
+        'relation': relation[keep][order],
+        'direction': geometry['direction'][keep][order],
+        'score': score[keep][order],
+    }
+
+
+def describe_relations(detections, max_relations=config.SPATIAL_MAX_RELATIONS):
+    """
+    生成中文空间关系描述
+    
+    Args:
+        detections: Detections
+        max_relations: 最多返回的关系条数
+        
+    Returns:
+        list: 如 ['杯子在餐桌上', '人在餐桌左侧']（已去重，按显著性排序）
+    """
+    if detections is None or len(detections) < 2:
+        return []
+    
+    relations = find_relations(detections.xyxy, detections.cls, detections.orig_shape)
+    
+    names = detections.names
+    def zh(class_id):
+        name = names.get(int(class_id), str(class_id))
+        return config.YOLO_CLASS_NAMES_ZH.get(name, name)
+    
+    texts = []
+    for s, o, rel, direction in zip(
+        relations['subject'].tolist(), relations['object'].tolist(),
+        relations['relation'].tolist(), relations['direction'].tolist()
+    ):
+        a, b = zh(detections.cls[s]), zh(detections.cls[o])
+        if rel == RELATION_CONTAIN:
+            if names.get(int(detections.cls[o])) in config.SPATIAL_SUPPORT_OBJECTS:
+                texts.append(f"{a}在{b}上")
+            else:
+                texts.append(f"{a}在{b}范围内")
+        elif rel == RELATION_OVERLAP:
+            texts.append(f"{a}与{b}相互遮挡")
+        else:
+            texts.append(f"{a}在{b}{DIRECTION_NAMES[direction]}")
+    
+    return list(dict.fromkeys(texts))[:max_relations]
@@ -0,0 +1,126 @@
+"""
+CLIP 文本嵌入缓存模块
+功能：按 归一化文本 + CLIP 模型名 缓存候选描述的文本特征（LRU 淘汰），
+      可选持久化到 .npz 文件，重复出现的候选无需再次分词与编码
+"""
+
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+import config
+
+
+def normalize_text(text):
+    """缓存键使用的文本归一化：全角/半角统一 (NFKC)，合并空白"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class TextEmbeddingCache:
+    """CLIP 文本嵌入 LRU 缓存（内存，可选持久化文件）"""
+    
+    def __init__(
+        self,
+        model_name,
+        cache_dir=config.CLIP_TEXT_CACHE_DIR,
+        max_entries=config.CLIP_TEXT_CACHE_MAX_ENTRIES
+    ):
+        """
+        初始化缓存
+        
+        Args:
+            model_name: CLIP 模型标识（参与缓存键计算，不同模型的嵌入互不混用）
+            cache_dir: 持久化目录（每个模型一个 .npz 文件），为 None 时只在内存中缓存
+            max_entries: 最多保留的条目数，超出后淘汰最久未使用的条目
+        """
+        self.model_name = model_name
+        self.cache_file = None
+        if cache_dir:
+            safe_name = re.sub(r"[^\w.-]", "_", model_name)
+            self.cache_file = os.path.join(cache_dir, f"{safe_name}.npz")
+        self.max_entries = max_entries
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self._lru = OrderedDict()  # key -> [D] float32 归一化特征，按访问时间从旧到新排列
+        self._dirty = False
+        self._load()
+        
+        if self.cache_file:
+            print(f"[CLIP] 文本嵌入缓存: {self.cache_file} ({len(self._lru)} 条)")
+    
+    def make_key(self, text):
+        """缓存键：CLIP 模型名 + 归一化文本"""
+        return f"{self.model_name}|{normalize_text(text)}"
+    
+    def get_many(self, texts):
+        """
+        批量查询缓存
+        
+        Returns:
+            list: 与 texts 一一对应的 [D] float32 特征，未命中为 None
+        """
+        features = []
+        for text in texts:
+            key = self.make_key(text)
+            feature = self._lru.get(key)
+            if feature is None:
+                self.misses += 1
+            else:
+                self._lru.move_to_end(key)
+                self.hits += 1
+            features.append(feature)
+        return features
+    
+    def put_many(self, texts, features):
+        """写入多条文本特征（features: [N, D] 归一化特征）"""
+        for text, feature in zip(texts, np.asarray(features, dtype=np.float32)):
+            key = self.make_key(text)
+            self._lru[key] = feature
+            self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+        self._dirty = True
+    
+    def flush(self):
+        """将缓存（按 LRU 顺序）写回持久化文件"""
+        if not self._dirty or not self.cache_file:
+            return
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_path = self.cache_file + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                keys=np.asarray(list(self._lru), dtype=str),
+                embeddings=np.stack(list(self._lru.values())) if self._lru else np.zeros((0, 0), np.float32)
+            )
+        os.replace(tmp_path, self.cache_file)
+        self._dirty = False
+    
+    def stats(self):
+        """返回命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._lru),
+        }
+    
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with np.load(self.cache_file) as entry:
+                keys, embeddings = entry["keys"], entry["embeddings"]
+        except (OSError, ValueError, KeyError):
+            # 损坏的缓存文件直接忽略，下次 flush 时覆盖
+            return
+        for key, feature in zip(keys.tolist(), embeddings):
+            self._lru[key] = feature
@@ -7,6 +7,7 @@ from PIL import Image
 import matplotlib.pyplot as plt
 import matplotlib
 import numpy as np
+from image_frame import as_frame
 
 # 设置中文字体（根据操作系统调整）
 matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
@@ -29,29 +30,30 @@ def load_image(image_path):
     return Image.open(image_path)
 
 
-def visualize_results(image_path, yolo_result, candidates, ranked_captions, save_path=None):
+def visualize_results(image, yolo_result, candidates, ranked_captions, save_path=None):
     """
     可视化完整结果
     
     Args:
-        image_path: 原始图像路径
+        image: 原始图像路径或 ImageFrame
         yolo_result: YOLO检测结果
         candidates: LLM生成的所有候选
         ranked_captions: CLIP排序后的结果 [(描述, 分数), ...]
         save_path: 保存路径（可选）
     """
+    frame = as_frame(image)
     fig = plt.figure(figsize=(16, 10))
     
     # 1. 原始图像
     ax1 = plt.subplot(2, 3, 1)
-    img = Image.open(image_path)
+    img = frame.pil()
     ax1.imshow(img)
     ax1.set_title("原始图像", fontsize=14, fontweight='bold')
     ax1.axis('off')
     
     # 2. YOLO检测结果
     ax2 = plt.subplot(2, 3, 2)
-    annotated = yolo_result['raw_results'][0].plot()
+    annotated = yolo_result['detections'].plot(frame.bgr)
     # OpenCV BGR to RGB
     annotated_rgb = annotated[:, :, ::-1]
     ax2.imshow(annotated_rgb)
@@ -127,12 +129,12 @@ def visualize_results(image_path, yolo_result, candidates, ranked_captions, save
     plt.show()
 
 
-def save_results_to_file(image_path, yolo_result, candidates, ranked_captions, output_file):
+def save_results_to_file(image, yolo_result, candidates, ranked_captions, output_file):
     """
     保存结果到文本文件
     
     Args:
-        image_path: 图像路径
+        image: 图像路径或 ImageFrame
         yolo_result: YOLO结果
         candidates: 候选列表
         ranked_captions: 排序后的候选
@@ -143,7 +145,7 @@ def save_results_to_file(image_path, yolo_result, candidates, ranked_captions, o
         f.write("图像描述生成系统 - 结果报告\n")
         f.write("="*60 + "\n\n")
         
-        f.write(f"输入图像: {image_path}\n\n")
+        f.write(f"输入图像: {as_frame(image).path}\n\n")
         
         f.write("-"*60 + "\n")
         f.write("1. YOLO 检测结果\n")
@@ -214,6 +216,11 @@ def is_image_file(filename):
         ".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"
     ))
 
+def is_video_file(filename):
+    return filename.lower().endswith((
+        ".mp4", ".avi", ".mov", ".mkv", ".webm", ".flv"
+    ))
+
 
 # ============ 测试代码 ============
 
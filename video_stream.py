@@ -0,0 +1,104 @@
+"""
+视频 / 摄像头帧流模块
+功能：惰性逐帧解码，并基于颜色直方图做廉价的场景切换检测，只让关键帧进入 YOLO→LLM→CLIP
+"""
+
+import cv2
+import config
+from image_frame import ImageFrame
+
+
+def open_capture(source):
+    """
+    打开视频文件或摄像头
+    
+    Args:
+        source: 视频文件路径，或摄像头编号（int 或纯数字字符串）
+    """
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"无法打开视频源: {source}")
+    return capture
+
+
+def iter_frames(source, stride=config.VIDEO_FRAME_STRIDE):
+    """
+    惰性逐帧读取
+    
+    Args:
+        source: 视频文件路径或摄像头编号
+        stride: 每隔 stride 帧取一帧（跳过的帧只抓取不解码）
+        
+    Yields:
+        (frame_index, timestamp_seconds, ImageFrame)
+    """
+    if stride < 1:
+        raise ValueError(f"stride 必须为正整数: {stride}")
+    capture = open_capture(source)
+    try:
+        index = 0
+        while True:
+            if index % stride == 0:
+                ok, bgr = capture.read()
+                if not ok:
+                    break
+                timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                yield index, timestamp, ImageFrame(bgr=bgr, label=f"{source}#{index}")
+            elif not capture.grab():
+                break
+            index += 1
+    finally:
+        capture.release()
+
+
+class SceneChangeDetector:
+    """基于 HSV 颜色直方图的场景切换检测"""
+    
+    def __init__(
+        self,
+        threshold=config.VIDEO_SCENE_THRESHOLD,
+        max_interval=config.VIDEO_MAX_KEYFRAME_INTERVAL,
+        size=64
+    ):
+        """
+        Args:
+            threshold: 与上一关键帧的直方图 Bhattacharyya 距离超过该值即视为场景切换 (0-1)
+            max_interval: 距上一关键帧超过该帧数时强制取关键帧（0 表示不限制）
+            size: 计算直方图前将帧缩放到的边长
+        """
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.size = size
+        self._last_hist = None
+        self._since_keyframe = 0
+    
+    def _histogram(self, bgr):
+        small = cv2.resize(bgr, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+        return cv2.normalize(hist, hist)
+    
+    def reset(self):
+        """清除参考直方图，下一帧必定视为关键帧（如关键帧生成描述失败时）"""
+        self._last_hist = None
+    
+    def is_keyframe(self, bgr):
+        """判断当前帧是否为关键帧，并在是关键帧时更新参考直方图"""
+        hist = self._histogram(bgr)
+        self._since_keyframe += 1
+        
+        if self._last_hist is None:
+            changed = True
+        else:
+            distance = cv2.compareHist(self._last_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+            changed = distance > self.threshold
+        
+        if self.max_interval and self._since_keyframe >= self.max_interval:
+            changed = True
+        
+        if changed:
+            self._last_hist = hist
+            self._since_keyframe = 0
+        return changed
@@ -3,31 +3,74 @@ YOLO 物体检测模块
 功能：检测图像中的物体、位置和场景信息
 """
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from ultralytics import YOLO
-from collections import Counter
+import numpy as np
 import config
+from box_ops import batched_nms, box_area
+from detection_cache import DetectionCache
+from detections import Detections
+from image_frame import ImageFrame, as_frame
 
 
 class YOLODetector:
     """YOLO物体检测器"""
     
-    def __init__(self, model_name=config.YOLO_MODEL):
+    def __init__(
+        self,
+        model_name=config.YOLO_MODEL,
+        use_cache=config.YOLO_CACHE_ENABLED,
+        backend=config.YOLO_BACKEND,
+        tiled=config.YOLO_TILED,
+        adaptive=config.YOLO_ADAPTIVE,
+        quantize=config.QUANTIZE_INT8
+    ):
         """
         初始化YOLO模型
         
         Args:
             model_name: YOLO模型名称，如 'yolov8n.pt'
+            use_cache: 是否启用检测结果磁盘缓存
+            backend: 推理后端，"torch"（ultralytics）或 "onnx"（ONNX Runtime CPU）
+            tiled: 是否默认使用切片推理（适合高分辨率图像）
+            adaptive: 是否默认使用自适应分辨率（先低分辨率预检，必要时再全尺寸推理）
+            quantize: 是否使用 int8 动态量化模型（CPU，基于 ONNX Runtime 后端）
         """
         print(f"[YOLO] 正在加载模型: {model_name}")
-        self.model = YOLO(model_name)
+        if quantize and backend != "onnx":
+            # 量化模型只提供 ONNX 版本
+            print(f"[YOLO] int8 量化模式使用 onnx 后端")
+            backend = "onnx"
+        print(f"[YOLO] 推理后端: {backend}{' (int8)' if quantize else ''}")
+        self.backend = backend
+        self.tiled = tiled
+        self.adaptive = adaptive
+        # 自适应分辨率各路径的图像数与推理耗时（秒），用于统计节省的延迟
+        self.adaptive_stats = {'low': 0, 'full': 0, 'low_time': 0.0, 'full_time': 0.0}
+        if backend == "torch":
+            self.model = YOLO(model_name)
+        elif backend == "onnx":
+            from onnx_backend import ONNXYOLO
+            self.model = ONNXYOLO(model_name, quantize=quantize)
+        else:
+            raise ValueError(f"不支持的YOLO后端: {backend}")
+        self._build_class_tables()
+        
+        # 不同后端的数值略有差异，非默认后端单独做缓存键
+        cache_name = model_name if backend == "torch" else f"{model_name}:{backend}"
+        if quantize:
+            cache_name += ":int8"
+        self.cache = DetectionCache(cache_name) if use_cache else None
         print(f"[YOLO] 模型加载完成")
     
-    def detect(self, image_path):
+    def detect(self, image):
         """
         检测图像中的物体
         
         Args:
-            image_path: 图像文件路径
+            image: 图像文件路径或 ImageFrame
             
         Returns:
             dict: {
@@ -35,68 +78,400 @@ class YOLODetector:
                 'counts': {'人': 2, '椅子': 1},    # 各物体数量
                 'positions': {'人': ['画面中央', '画面右侧']},  # 物体位置
                 'scene': '室内',  # 场景类型
-                'raw_results': results  # 原始检测结果（用于可视化）
+                'detections': Detections  # 紧凑检测框（用于可视化）
             }
         """
-        print(f"[YOLO] 正在检测图像: {image_path}")
+        if self.tiled:
+            return self.detect_tiled(image)
+        if self.adaptive:
+            return self.detect_adaptive(image)
+        
+        frame = as_frame(image)
+        print(f"[YOLO] 正在检测图像: {frame.label}")
+        
+        # 查询缓存
+        cache_key, cached = self._lookup_cache(frame)
+        if cached is not None:
+            print(f"[YOLO] 命中检测缓存")
+            return cached
         
         # 执行检测
+        detections = self._predict([frame])[0]
+        
+        return self._parse_detections(detections, cache_key)
+    
+    def detect_batch(self, images, batch_size=config.YOLO_BATCH_SIZE):
+        """
+        批量检测多张图像（按固定大小分批送入模型）
+        
+        Args:
+            images: 图像文件路径或 ImageFrame 列表
+            batch_size: 每批送入模型的图像数量
+            
+        Returns:
+            list: 与 images 一一对应的结果字典，格式同 detect()
+        """
+        frames = [as_frame(image) for image in images]
+        if self.tiled:
+            # 切片推理时每张图像的所有切片已作为一个 batch
+            return [self.detect_tiled(frame) for frame in frames]
+        
+        print(f"[YOLO] 正在批量检测 {len(frames)} 张图像 (batch_size={batch_size})")
+        
+        outputs = [None] * len(frames)
+        
+        # 先查缓存，只有未命中的图像进入模型
+        pending = []  # (下标, 缓存键)
+        variant = self._adaptive_variant() if self.adaptive else ""
+        for i, frame in enumerate(frames):
+            cache_key, cached = self._lookup_cache(frame, variant)
+            if cached is not None:
+                print(f"[YOLO] 图像: {frame.label} (命中检测缓存)")
+                if self.adaptive:
+                    cached['yolo_path'] = "cache"
+                outputs[i] = cached
+                continue
+            pending.append((i, cache_key))
+        
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            chunk_frames = [frames[i] for i, _ in chunk]
+            if self.adaptive:
+                batch_detections, paths = self._predict_adaptive(chunk_frames)
+            else:
+                batch_detections, paths = self._predict(chunk_frames), [None] * len(chunk)
+            for (i, cache_key), detections, path in zip(chunk, batch_detections, paths):
+                print(f"[YOLO] 图像: {frames[i].label}")
+                outputs[i] = self._parse_detections(detections, cache_key)
+                if path is not None:
+                    outputs[i]['yolo_path'] = path
+        
+        return outputs
+    
+    def detect_adaptive(self, image):
+        """
+        自适应分辨率检测：先以 YOLO_ADAPTIVE_LOW_IMGSZ 推理，
+        只有小物体或低置信度框较多时才以 YOLO_IMGSZ 重新推理
+        
+        Args:
+            image: 图像文件路径或 ImageFrame
+            
+        Returns:
+            dict: 同 detect()，另含 'yolo_path': "low"（仅低分辨率）/ "full"（重新推理）/ "cache"
+        """
+        frame = as_frame(image)
+        print(f"[YOLO] 正在自适应检测图像: {frame.label}")
+        
+        cache_key, cached = self._lookup_cache(frame, self._adaptive_variant())
+        if cached is not None:
+            print(f"[YOLO] 命中检测缓存")
+            cached['yolo_path'] = "cache"
+            return cached
+        
+        detections, paths = self._predict_adaptive([frame])
+        result = self._parse_detections(detections[0], cache_key)
+        result['yolo_path'] = paths[0]
+        return result
+    
+    def _predict_adaptive(self, frames):
+        """
+        对一批图像做自适应分辨率推理
+        
+        Returns:
+            (detections, paths): 与 frames 一一对应的 Detections 与所走路径 ("low" / "full")
+        """
+        t = time.perf_counter()
+        detections = self._predict(frames, imgsz=config.YOLO_ADAPTIVE_LOW_IMGSZ)
+        self.adaptive_stats['low_time'] += time.perf_counter() - t
+        
+        rerun = [i for i, det in enumerate(detections) if _needs_full_resolution(det)]
+        if rerun:
+            t = time.perf_counter()
+            full = self._predict([frames[i] for i in rerun])
+            self.adaptive_stats['full_time'] += time.perf_counter() - t
+            for i, det in zip(rerun, full):
+                detections[i] = det
+        
+        self.adaptive_stats['full'] += len(rerun)
+        self.adaptive_stats['low'] += len(frames) - len(rerun)
+        rerun = set(rerun)
+        paths = ["full" if i in rerun else "low" for i in range(len(frames))]
+        print(f"[YOLO] 自适应分辨率: {len(frames) - len(rerun)} 张仅低分辨率, {len(rerun)} 张全尺寸重新推理")
+        return detections, paths
+    
+    @staticmethod
+    def _adaptive_variant():
+        """自适应分辨率的缓存键标识（判定参数不同，最终结果可能不同）"""
+        return (
+            f"adaptive:{config.YOLO_ADAPTIVE_LOW_IMGSZ}:{config.YOLO_IMGSZ}"
+            f":{config.YOLO_ADAPTIVE_SMALL_AREA}:{config.YOLO_ADAPTIVE_LOW_CONF}"
+            f":{config.YOLO_ADAPTIVE_RERUN_COUNT}:{config.YOLO_ADAPTIVE_RERUN_RATIO}"
+        )
+    
+    def adaptive_summary(self):
+        """
+        自适应分辨率统计
+        
+        Returns:
+            dict: {'low', 'full': 各路径图像数, 'rerun_rate': 重新推理比例,
+                   'low_ms', 'full_ms': 两种分辨率单张平均推理耗时（毫秒）,
+                   'saved_ms': 相比全部全尺寸推理估计节省的总耗时（毫秒）}
+            全尺寸耗时只能从重新推理的图像估计：没有图像重新推理时 full_ms 与 saved_ms 为 None（未知）
+        """
+        stats = self.adaptive_stats
+        total = stats['low'] + stats['full']
+        low_ms = stats['low_time'] * 1000 / max(total, 1)
+        full_ms = saved_ms = None
+        if stats['full']:
+            full_ms = stats['full_time'] * 1000 / stats['full']
+            # 未重新推理的图像省下一次全尺寸推理，但所有图像都多付了一次低分辨率推理
+            saved_ms = stats['low'] * full_ms - total * low_ms
+        return {
+            'low': stats['low'],
+            'full': stats['full'],
+            'rerun_rate': stats['full'] / max(total, 1),
+            'low_ms': low_ms,
+            'full_ms': full_ms,
+            'saved_ms': saved_ms,
+        }
+    
+    def detect_tiled(
+        self,
+        image,
+        tile_size=config.YOLO_TILE_SIZE,
+        overlap=config.YOLO_TILE_OVERLAP,
+        workers=config.YOLO_TILE_WORKERS
+    ):
+        """
+        切片推理：将大图切成重叠的图块分别检测，再用全局 NMS 合并
+        
+        Args:
+            image: 图像文件路径或 ImageFrame
+            tile_size: 图块边长（像素）
+            overlap: 相邻图块的重叠比例 (0-1)
+            workers: >1 时用线程池并行推理各图块（仅 onnx 后端），否则作为一个 batch 推理
+            
+        Returns:
+            dict: 同 detect()
+        """
+        frame = as_frame(image)
+        print(f"[YOLO] 正在切片检测图像: {frame.label} (tile={tile_size}, overlap={overlap})")
+        
+        variant = f"tiled:{tile_size}:{overlap}:{config.YOLO_TILE_INCLUDE_FULL}"
+        cache_key, cached = self._lookup_cache(frame, variant)
+        if cached is not None:
+            print(f"[YOLO] 命中检测缓存")
+            return cached
+        
+        detections = self._predict_tiled(frame, tile_size, overlap, workers)
+        return self._parse_detections(detections, cache_key)
+    
+    def _predict_tiled(self, frame, tile_size, overlap, workers):
+        """对单张图像做切片推理，返回合并后的 Detections"""
+        image = frame.bgr
+        height, width = image.shape[:2]
+        
+        offsets = [
+            (x, y)
+            for y in _tile_starts(height, tile_size, overlap)
+            for x in _tile_starts(width, tile_size, overlap)
+        ]
+        tiles = [
+            ImageFrame(bgr=image[y:y + tile_size, x:x + tile_size])
+            for x, y in offsets
+        ]
+        
+        if workers > 1 and self.backend == "onnx":
+            # ONNX Runtime 会话可并发调用；ultralytics 预测器不是线程安全的
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                tile_detections = list(pool.map(lambda tile: self._predict([tile])[0], tiles))
+        else:
+            tile_detections = []
+            for start in range(0, len(tiles), config.YOLO_BATCH_SIZE):
+                tile_detections.extend(self._predict(tiles[start:start + config.YOLO_BATCH_SIZE]))
+        
+        # 图块坐标 -> 原图坐标
+        parts = []
+        for (x, y), detections in zip(offsets, tile_detections):
+            data = detections.to_array()
+            data[:, [0, 2]] += x
+            data[:, [1, 3]] += y
+            parts.append(data)
+        
+        # 整图推理补充跨越多个图块的大物体
+        if config.YOLO_TILE_INCLUDE_FULL and len(tiles) > 1:
+            parts.append(self._predict([frame])[0].to_array())
+        
+        data = np.concatenate(parts)
+        keep = batched_nms(
+            data[:, :4], data[:, 4], data[:, 5].astype(np.int64), config.YOLO_IOU_THRESHOLD
+        )
+        return Detections.from_array(data[keep], (height, width), self.model.names, frame.path)
+    
+    def _lookup_cache(self, frame, variant=""):
+        """
+        查询检测缓存
+        
+        视频帧等一次性图像（无路径）不查询也不写入缓存，省去为计算哈希而做的 JPEG 编码
+        
+        Returns:
+            (cache_key, result): 未启用缓存或图像无路径时 cache_key 为 None；未命中时 result 为 None
+        """
+        if self.cache is None or not frame.path:
+            return None, None
+        cache_key = self.cache.make_key(frame.sha256, variant)
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return cache_key, None
+        return cache_key, self._result_from_cache(frame, *cached)
+    
+    def _predict(self, frames, imgsz=config.YOLO_IMGSZ):
+        """
+        在当前后端上执行一次（批量）推理
+        
+        Args:
+            frames: ImageFrame 列表，作为一个 batch 送入模型
+            imgsz: 推理输入尺寸
+            
+        Returns:
+            list: 与 frames 一一对应的 Detections
+        """
+        if self.backend == "onnx":
+            return self.model.predict(
+                frames,
+                conf=config.YOLO_CONF_THRESHOLD,
+                iou=config.YOLO_IOU_THRESHOLD,
+                imgsz=imgsz
+            )
+        
+        # 直接传入已解码的数组，避免 ultralytics 再次读盘解码
         results = self.model(
-            image_path, 
+            [frame.bgr for frame in frames],
             conf=config.YOLO_CONF_THRESHOLD,
             iou=config.YOLO_IOU_THRESHOLD,
+            imgsz=imgsz,
+            batch=len(frames),
             verbose=False
         )
+        # 只保留检测框数组，不保留 Results（含原图引用）
+        detections = [Detections.from_results(r) for r in results]
+        for frame, det in zip(frames, detections):
+            det.path = frame.path
+        return detections
+    
+    def _parse_detections(self, detections, cache_key=None):
+        """
+        将单张图像的检测框解析为 detect() 的返回格式
         
-        # 解析结果
-        detections = results[0]  # 第一张图像的结果
-        boxes = detections.boxes
+        Args:
+            detections: Detections
+            cache_key: 非空时将检测框写入缓存
+            
+        Returns:
+            dict: 同 detect()
+        """
+        if cache_key is not None:
+            self.cache.put(cache_key, detections.to_array(), detections.orig_shape)
         
-        objects_en = []  # 英文物体名称列表
-        objects_zh = []  # 中文物体名称列表
-        positions = {}   # 物体位置字典
+        return self._build_result(detections)
+    
+    def _result_from_cache(self, frame, data, orig_shape):
+        """用缓存的检测框重建 detect() 结果（不运行模型、不解码图像）"""
+        detections = Detections.from_array(data, orig_shape, self.model.names, frame.path)
+        return self._build_result(detections)
+    
+    def _build_result(self, detections):
+        """由 Detections 生成 detect() 的返回字典"""
+        result = self._summarize(detections.xyxy, detections.cls, detections.orig_shape)
+        result['detections'] = detections
+        return result
+    
+    def _build_class_tables(self):
+        """根据模型类别表构建 类别ID -> 中文名/场景 的查找数组"""
+        names = self.model.names
+        num_classes = max(names) + 1 if names else 0
         
-        # 获取图像尺寸（用于归一化坐标）
-        img_height, img_width = detections.orig_shape
-        
-        # 遍历每个检测到的物体
-        for box in boxes:
-            # 获取类别
-            class_id = int(box.cls[0])
-            class_name_en = self.model.names[class_id]
-            class_name_zh = config.YOLO_CLASS_NAMES_ZH.get(class_name_en, class_name_en)
-            
-            objects_en.append(class_name_en)
-            objects_zh.append(class_name_zh)
-            
-            # 获取边界框中心坐标
-            xyxy = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
-            x_center = ((xyxy[0] + xyxy[2]) / 2) / img_width
-            y_center = ((xyxy[1] + xyxy[3]) / 2) / img_height
-            
-            # 计算位置描述
-            position = config.get_position_description(x_center, y_center)
+        names_zh = [
+            config.YOLO_CLASS_NAMES_ZH.get(names.get(i, str(i)), names.get(i, str(i)))
+            for i in range(num_classes)
+        ]
+        # 多个英文类别可能对应同一中文名（如 skis/snowboard），按中文名分组
+        self._zh_names = list(dict.fromkeys(names_zh))
+        zh_index = {name: i for i, name in enumerate(self._zh_names)}
+        self._class_to_zh = np.array([zh_index[n] for n in names_zh], dtype=np.int64)
+        
+        self._class_is_indoor = np.array(
+            [names.get(i) in config.INDOOR_OBJECTS for i in range(num_classes)], dtype=bool
+        )
+        self._class_is_outdoor = np.array(
+            [names.get(i) in config.OUTDOOR_OBJECTS for i in range(num_classes)], dtype=bool
+        )
+        
+        # 3x3 位置描述表，下标为 [水平区间, 垂直区间]
+        self._position_table = np.array(
+            [[h + v for v in config.V_POSITION_NAMES] for h in config.H_POSITION_NAMES],
+            dtype=object
+        )
+    
+    def _summarize(self, xyxy, cls_ids, orig_shape):
+        """
+        基于数组计算物体列表、数量、位置与场景
+        
+        Args:
+            xyxy: [N, 4] 边界框 (x1, y1, x2, y2)，原图坐标
+            cls_ids: [N] 类别ID
+            orig_shape: 原图尺寸 (height, width)
             
-            # 记录位置
-            if class_name_zh not in positions:
-                positions[class_name_zh] = []
-            positions[class_name_zh].append(position)
+        Returns:
+            dict: detect() 结果中的 objects/counts/positions/scene 部分
+        """
+        # 获取图像尺寸（用于归一化坐标）
+        img_height, img_width = orig_shape
+        
+        # 中文类别（按分组后的下标）
+        zh_ids = self._class_to_zh[cls_ids]
+        objects_zh = [self._zh_names[i] for i in zh_ids.tolist()]
         
-        # 统计物体数量
-        counts = dict(Counter(objects_zh))
+        # 边界框中心坐标（归一化）
+        x_centers = ((xyxy[:, 0] + xyxy[:, 2]) / 2) / img_width
+        y_centers = ((xyxy[:, 1] + xyxy[:, 3]) / 2) / img_height
+        
+        # 3x3 位置区间，与 config.get_position_description 的判定一致
+        h_bins = (x_centers >= config.POSITION_THRESHOLDS[0]).astype(np.int64) \
+            + (x_centers >= config.POSITION_THRESHOLDS[1])
+        v_bins = (y_centers >= config.POSITION_THRESHOLDS[0]).astype(np.int64) \
+            + (y_centers >= config.POSITION_THRESHOLDS[1])
+        position_labels = self._position_table[h_bins, v_bins]
+        
+        # 按中文类别分组，顺序为首次出现的顺序（与逐框遍历时一致）
+        unique_ids, first_index, class_counts = np.unique(
+            zh_ids, return_index=True, return_counts=True
+        )
+        appearance = np.argsort(first_index, kind='stable')
+        order = np.argsort(zh_ids, kind='stable')
+        groups = np.split(position_labels[order], np.cumsum(class_counts)[:-1])
+        
+        counts = {}
+        positions = {}
+        for k in appearance.tolist():
+            name = self._zh_names[unique_ids[k]]
+            counts[name] = int(class_counts[k])
+            positions[name] = groups[k].tolist()
         
         # 去重物体列表
         unique_objects = list(set(objects_zh))
         
         # 推断场景类型
-        scene = config.classify_scene(objects_en)
+        scene = config.scene_from_counts(
+            int(self._class_is_indoor[cls_ids].sum()),
+            int(self._class_is_outdoor[cls_ids].sum())
+        )
         
         result = {
             'objects': unique_objects,
             'counts': counts,
             'positions': positions,
             'scene': scene,
-            'raw_results': results
         }
         
         print(f"[YOLO] 检测完成: 发现 {len(unique_objects)} 种物体")
@@ -106,7 +481,7 @@ class YOLODetector:
         
         return result
     
-    def visualize(self, detection_result, save_path=None, show=False):
+    def visualize(self, detection_result, save_path=None, show=False, image=None):
         """
         可视化检测结果
         
@@ -114,11 +489,12 @@ class YOLODetector:
             detection_result: detect() 返回的结果字典
             save_path: 保存路径（可选）
             show: 是否显示图像
+            image: 已解码的 ImageFrame（可选，为空时从检测结果记录的路径读取）
         """
-        results = detection_result['raw_results']
-        
-        # 使用YOLO内置的可视化
-        annotated = results[0].plot()
+        # 由检测框数组绘制
+        annotated = detection_result['detections'].plot(
+            image.bgr if image is not None else None
+        )
         
         if save_path:
             import cv2
@@ -134,6 +510,29 @@ class YOLODetector:
         return annotated
 
 
+def _needs_full_resolution(detections):
+    """低分辨率结果中小物体或低置信度框是否足够多，需要全尺寸重新推理"""
+    if len(detections) == 0:
+        return False
+    height, width = detections.orig_shape
+    small = box_area(detections.xyxy) < config.YOLO_ADAPTIVE_SMALL_AREA * height * width
+    uncertain = int((small | (detections.conf < config.YOLO_ADAPTIVE_LOW_CONF)).sum())
+    return (
+        uncertain >= config.YOLO_ADAPTIVE_RERUN_COUNT
+        or uncertain >= config.YOLO_ADAPTIVE_RERUN_RATIO * len(detections)
+    )
+
+
+def _tile_starts(length, tile_size, overlap):
+    """计算一个维度上各图块的起点，最后一块与边缘对齐"""
+    if length <= tile_size:
+        return [0]
+    step = max(1, int(tile_size * (1 - overlap)))
+    starts = list(range(0, length - tile_size, step))
+    starts.append(length - tile_size)
+    return starts
+
+
 # ============ 测试代码 ============
 
 if __name__ == "__main__":